@@ -1,91 +1,265 @@
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    g,
+    render_template,
+    request,
+    session,
+    redirect,
+    url_for,
+    jsonify,
+    stream_with_context,
+)
 from datetime import datetime
-from honban import QuizGenerator
-from firebase_service import FirebaseService
+from http_cache import shared_cache
+from game_store import new_game_id
+from honban import QUESTION_FIELDS
+from model_router import ModelUnavailableError
+from rate_limit import RateLimited
+import log_config
+import metrics
+import services
+import contextvars
+import json
+import logging
+import math
 import os
 import time
+import uuid
 from dotenv import load_dotenv
 from pathlib import Path
 
 # ✅ .envファイルを読み込み（app.pyと同階層）
 env_path = Path(__file__).resolve().parent / ".env"
+env_error = None
 try:
     load_dotenv(dotenv_path=env_path)
-    print("✅ .envファイルの読み込みに成功しました")
 except Exception as e:
-    print(f"⚠️ .envファイルの読み込みに失敗: {e}")
-
-
-print(f"🔍 GEMINI_API_KEY: {os.getenv('GEMINI_API_KEY')[:12]}...")
-
-# ✅ Flaskアプリ初期化
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", "your_secret_key")
-
-# ✅ QuizGenerator初期化
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("❌ GEMINI_API_KEYが設定されていません。HerokuのConfig Varsを確認してください。")
-    quiz_generator = None
-else:
-    try:
-        quiz_generator = QuizGenerator(api_key=api_key)
-        print("✅ QuizGeneratorの初期化に成功しました")
-    except Exception as e:
-        print(f"❌ QuizGenerator初期化エラー: {e}")
-        quiz_generator = None
-
-# ✅ Firebaseサービス初期化
-try:
-    firebase_service = FirebaseService()
-    print("✅ Firebase: サービス初期化成功")
-except Exception as e:
-    print(f"⚠️ Firebase初期化失敗: {e}")
-    firebase_service = None
+    env_error = e
+
+# LOG_LEVEL等は.envでも指定できるよう、読み込んだ後に設定する
+log_config.configure()
+logger = logging.getLogger(__name__)
+if env_error is not None:
+    logger.warning(".envファイルの読み込みに失敗: %s", env_error)
+
+# ✅ ルート定義（Gemini・Firebase等のサービスは最初に使われたときに初期化）
+bp = Blueprint("main", __name__, cli_group=None)
+
+
+def get_quiz(fallback=True, category=None):
+    """プールがあればプールから、なければ同期生成でクイズを取得
+
+    fallback=False の場合、プールが空ならNoneを返す。
+    category を指定すると、そのカテゴリの記事から作ったクイズを返す。
+    """
+    services.start_crawler()
+    quiz_pool = services.get_quiz_pool()
+    if quiz_pool is not None:
+        quiz_data = quiz_pool.get(fallback=fallback, category=category)
+        if quiz_data is not None or category is None:
+            return quiz_data
+    return services.get_quiz_generator().create_quiz(category) if fallback else None
+
+
+def get_categories():
+    """選べるカテゴリ [(名前, 表示名), ...]（記事の収集が無効なら空）"""
+    article_sources = services.get_article_sources()
+    return article_sources.categories if article_sources is not None else []
+
+
+def attach_article(quiz_data, article):
+    """クイズに元記事の情報を付ける"""
+    quiz_data["article_content"] = article["content"]
+    quiz_data["article_url"] = article["url"]
+    quiz_data["article_title"] = article["title"]
+    return quiz_data
+
+
+def load_game():
+    """クッキーのゲームIDからゲーム状態を取得。なければ (None, None)"""
+    game_id = session.get("game_id")
+    if not game_id:
+        return None, None
+    with metrics.span("game_store.get"):
+        game = services.get_game_store().get(game_id)
+    if not game:
+        return None, None
+    metrics.set_context(ai_level=game.get("ai_level", "normal"))
+    log_config.set_context(game_id=game_id)
+    return game_id, game
+
+
+def save_game(game_id, game):
+    """ゲーム状態を保存"""
+    with metrics.span("game_store.put"):
+        services.get_game_store().put(game_id, game)
+
+
+STATS_MAX_AGE = int(os.environ.get("STATS_CACHE_TTL", 30))
+# 事前生成中のクイズを待つ最大秒数（間に合わなければその場で生成する）
+PREFETCH_WAIT = float(os.environ.get("QUIZ_PREFETCH_WAIT", 20))
+# SSEで問題を送る場合の待ち時間。間に合わなければ記事を先に表示してSSEで送るため、
+# リクエストのスレッドを生成の完了まで止めない
+PREFETCH_STREAM_WAIT = float(os.environ.get("QUIZ_PREFETCH_STREAM_WAIT", 0))
+
+
+def cacheable(response, max_age=STATS_MAX_AGE):
+    """ETagとCache-Controlを付け、変化がなければ304を返す"""
+    response = current_app.make_response(response)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.before_app_request
+def start_request_timer():
+    """リクエスト全体の所要時間を計測（ラベルのrouteもここで設定）"""
+    g.request_started = time.perf_counter()
+    metrics.clear_context()
+    metrics.set_context(route=request.url_rule.rule if request.url_rule else "unmatched")
+    # Herokuのルーターが付けるIDがあればそれを使い、ログを突き合わせられるようにする
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    log_config.clear_context()
+    log_config.set_context(request_id=g.request_id)
+
+
+@bp.after_app_request
+def add_request_id(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+    return response
+
+
+@bp.teardown_app_request
+def record_request_time(error):
+    started = g.pop("request_started", None)
+    if started is not None:
+        metrics.observe("request", time.perf_counter() - started)
+    metrics.clear_context()
+    log_config.clear_context()
+
+
+@bp.app_errorhandler(RateLimited)
+@bp.app_errorhandler(ModelUnavailableError)
+def service_unavailable(error):
+    """Gemini・Yahoo!の回数制限やモデルの障害で今は生成できない場合は、すぐに503を返す"""
+    retry_after = max(1, math.ceil(error.retry_after))
+    logger.warning("混雑のため断りました: %s", error, extra={"retry_after": retry_after})
+    message = f"混み合っています。{retry_after}秒ほど待ってからもう一度お試しください。"
+    if request.path.startswith("/api/"):
+        response = jsonify({"error": message, "retry_after": retry_after})
+    else:
+        response = current_app.make_response(render_template("error.html", error_message=message))
+    response.status_code = 503
+    response.headers["Retry-After"] = str(retry_after)
+    return response
 
 
-@app.route("/", methods=["GET"])
+@bp.route("/", methods=["GET"])
 def index():
     """トップページ"""
     return render_template("index.html")
 
 
-@app.route("/game", methods=["GET", "POST"])
+@bp.route("/game", methods=["GET", "POST"])
 def game():
     """ゲーム開始ページ"""
     if request.method == "POST":
         # AIレベルの選択を受け取る
         ai_level = request.form.get("ai_level", "normal")
-        session["ai_level"] = ai_level
-        session["score"] = {"player": 0, "ai": 0}
-        session["round"] = 0
-        session["total_rounds"] = 5
-        session["game_start_time"] = time.time()  # ゲーム開始時刻を記録
-        session["question_results"] = []  # 個別問題結果を保存するリスト
-        return redirect(url_for("quiz"))
-    return render_template("game.html")
-
-
-@app.route("/quiz", methods=["GET", "POST"])
+        # テーマのカテゴリ（未指定・不明ならすべてのカテゴリから出題）
+        category = request.form.get("category") or None
+        if category not in dict(get_categories()):
+            category = None
+        game_id = new_game_id()
+        log_config.set_context(game_id=game_id)
+        quiz_prefetcher = services.get_quiz_prefetcher()
+        game = {
+            "ai_level": ai_level,
+            "category": category,
+            "score": {"player": 0, "ai": 0},
+            "round": 0,
+            "total_rounds": 5,
+            "game_start_time": time.time(),  # ゲーム開始時刻を記録
+            "question_results": [],  # 個別問題結果を保存するリスト
+            # 事前生成したクイズのうち出題済みの数
+            "prefetch_taken": 0 if quiz_prefetcher is not None else None,
+        }
+        save_game(game_id, game)
+        if quiz_prefetcher is not None:
+            # 全ラウンドのクイズを並行して生成しておく（できた順に出題する）
+            services.start_crawler()
+            quiz_prefetcher.start(game_id, game["total_rounds"], category=category)
+        session.clear()
+        session["game_id"] = game_id
+        return redirect(url_for("main.quiz"))
+    return render_template("game.html", categories=get_categories())
+
+
+@bp.route("/quiz", methods=["GET", "POST"])
 def quiz():
     """クイズページ"""
-    if "round" not in session:
-        return redirect(url_for("index"))
+    game_id, game = load_game()
+    if game is None:
+        return redirect(url_for("main.index"))
 
-    ai_level = session.get("ai_level", "normal")
+    quiz_generator = services.get_quiz_generator()
+    quiz_streamer = services.get_quiz_streamer()
+    firebase_service = services.get_firebase_service()
+    ai_level = game.get("ai_level", "normal")
 
     if request.method == "GET":
         # 新しい問題の用意
         try:
             if quiz_generator is None:
                 error_msg = "クイズ生成サービスが初期化されていません。GEMINI_API_KEY環境変数が正しく設定されているか確認してください。"
-                print(f"クイズ生成失敗: quiz_generator is None")
+                logger.error("クイズ生成失敗: quiz_generator is None")
                 return render_template("error.html", error_message=error_msg), 500
 
-            quiz_data = quiz_generator.create_quiz()
+            quiz_data = None
+            quiz_prefetcher = services.get_quiz_prefetcher()
+            if quiz_prefetcher is not None and game.get("prefetch_taken") is not None:
+                # できていなければ、生成中の分は次のラウンドで使う
+                quiz_data = quiz_prefetcher.take(
+                    game_id,
+                    game["prefetch_taken"],
+                    timeout=PREFETCH_WAIT if quiz_streamer is None else PREFETCH_STREAM_WAIT,
+                )
+                if quiz_data:
+                    game["prefetch_taken"] += 1
+            if quiz_data is None:
+                quiz_data = get_quiz(
+                    fallback=quiz_streamer is None, category=game.get("category")
+                )
+            if quiz_data is None and quiz_streamer is not None:
+                # プールが空なら記事だけ先に表示し、問題はSSEで送る
+                article = quiz_generator.get_news_article(game.get("category"))
+                job = quiz_streamer.start(article)
+                game.pop("current_quiz", None)
+                game["pending_quiz"] = {"id": job.id, "article": article}
+                game["ai_buzzer_time"] = quiz_generator.simulate_ai_buzzer(ai_level)
+                save_game(game_id, game)
+                return render_template(
+                    "quiz.html",
+                    stream_url=url_for("main.quiz_stream"),
+                    article_content=article["content"],
+                    article_url=article["url"],
+                    article_title=article["title"],
+                    round=game["round"] + 1,
+                    total=game["total_rounds"],
+                    ai_level=ai_level,
+                    ai_thinking=quiz_generator.get_ai_thinking_message(ai_level),
+                )
+
             if quiz_data:
-                session["current_quiz"] = quiz_data
-                session["ai_buzzer_time"] = quiz_generator.simulate_ai_buzzer(ai_level)
+                game.pop("pending_quiz", None)
+                game["current_quiz"] = quiz_data
+                game["ai_buzzer_time"] = quiz_generator.simulate_ai_buzzer(ai_level)
+                save_game(game_id, game)
                 ai_thinking = quiz_generator.get_ai_thinking_message(ai_level)
                 return render_template(
                     "quiz.html",
@@ -97,55 +271,60 @@ def quiz():
                     article_content=quiz_data["article_content"],
                     article_url=quiz_data["article_url"],
                     article_title=quiz_data["article_title"],
-                    round=session["round"] + 1,
-                    total=session["total_rounds"],
+                    round=game["round"] + 1,
+                    total=game["total_rounds"],
                     ai_level=ai_level,
                     ai_thinking=ai_thinking,
                 )
             else:
                 # quiz_dataが取得できなかった場合のエラーハンドリング
                 error_msg = "クイズの生成に失敗しました。APIキーが正しく設定されているか確認してください。"
-                print(f"クイズ生成失敗: quiz_data is None")
+                logger.error("クイズ生成失敗: quiz_data is None")
                 return render_template("error.html", error_message=error_msg), 500
+        except (RateLimited, ModelUnavailableError):
+            # service_unavailable で503にする
+            raise
         except Exception as e:
             error_msg = f"クイズの生成中にエラーが発生しました: {str(e)}"
-            print(f"クイズ生成エラー: {e}")
+            logger.exception("クイズ生成エラー: %s", e)
             return render_template("error.html", error_message=error_msg), 500
 
     elif request.method == "POST":
-        quiz_data = session.get("current_quiz", {})
+        quiz_data = game.get("current_quiz")
+        pending = game.get("pending_quiz")
+        if not quiz_data and pending and quiz_streamer is not None:
+            # SSEの完了前に回答された場合は、このプロセスの生成を待つ
+            job = quiz_streamer.get(pending["id"])
+            if job is not None and job.wait(lambda j: j.done, timeout=30) and job.quiz:
+                quiz_data = attach_article(dict(job.quiz), pending["article"])
         if not quiz_data:
-            return redirect(url_for("index"))
+            return redirect(url_for("main.index"))
 
         player_time = float(request.form.get("time", 999))
-        ai_time = session.get("ai_buzzer_time", 999)
+        ai_time = game.get("ai_buzzer_time", 999)
 
         # 変数を初期化
         result = None
         ai_thinking = None  # ここで初期化
 
-        print("\n==== 回答判定開始 ====")
-        print(f"プレイヤーの回答時間: {player_time:.2f}秒")
-        print(f"AIの回答時間: {ai_time:.2f}秒")
-
         if player_time < ai_time:
-            print("\n✨ プレイヤーが早押し成功！")
             user_answer = request.form.get("answer", "").strip().upper()
             correct_answer = quiz_data.get("answer", "").upper()
-
-            print(f"問題: {quiz_data.get('question')}")
-            print(f"プレイヤーの回答: {user_answer}")
-            print(f"正解: {correct_answer}")
+            # 問題文と回答はINFOでは出さない（ログから正解が読めてしまうため）
+            logger.debug(
+                "プレイヤーの回答: %s（正解: %s）問題: %s",
+                user_answer,
+                correct_answer,
+                quiz_data.get("question"),
+            )
 
             if user_answer == correct_answer:
-                session["score"]["player"] += 1
+                game["score"]["player"] += 1
                 result = "correct"
                 result_type = "correct"
-                print("\n🎉 正解！")
             else:
                 result = "wrong"
                 result_type = "wrong"
-                print("\n❌ 不正解...")
 
             # 個別問題結果をFirebaseに保存
             firebase_service.save_individual_question_result(
@@ -162,23 +341,16 @@ def quiz():
             ai_thinking = "まだ考えていたのに..."
 
         else:
-            print("\n🤖 AIが早押し成功！")
-            ai_level = session.get("ai_level", "normal")
             ai_correct = quiz_generator.simulate_ai_answer(ai_level)
             ai_thinking = quiz_generator.get_ai_thinking_message(ai_level)
 
-            print(f"問題: {quiz_data.get('question')}")
-            print(f"正解: {quiz_data.get('answer')}")
-
             if ai_correct:
                 result = "ai_correct"
                 result_type = "ai_correct"
-                session["score"]["ai"] += 1
-                print("\n🎯 AIが正解！")
+                game["score"]["ai"] += 1
             else:
                 result = "ai_wrong"
                 result_type = "ai_wrong"
-                print("\n😅 AIが不正解！")
 
             # AIが回答した場合もFirebaseに保存
             firebase_service.save_individual_question_result(
@@ -191,16 +363,25 @@ def quiz():
                 ai_level,
             )
 
-        print(f"プレイヤーの得点: {session['score']['player']}点")
-        print(f"AIの得点: {session['score']['ai']}点")
-
-        print("\n==== ラウンド情報 ====")
-        session["round"] += 1
-        print(f"現在のラウンド: {session['round']}/{session['total_rounds']}")
+        game["round"] += 1
+        logger.info(
+            "ラウンド%d/%d: %s",
+            game["round"],
+            game["total_rounds"],
+            result,
+            extra={
+                "round": game["round"],
+                "result": result,
+                "player_time": round(player_time, 2),
+                "ai_time": round(ai_time, 2),
+                "player_score": game["score"]["player"],
+                "ai_score": game["score"]["ai"],
+            },
+        )
+        save_game(game_id, game)
 
-        if session["round"] >= session["total_rounds"]:
-            print("\n🏁 ゲーム終了！")
-            return redirect(url_for("result"))
+        if game["round"] >= game["total_rounds"]:
+            return redirect(url_for("main.result"))
 
         # 必ず返り値を返す
         return render_template(
@@ -214,15 +395,75 @@ def quiz():
             explanation=quiz_data.get("explanation", ""),
             result=result,
             ai_thinking=ai_thinking,  # 常に定義された状態で渡される
-            round=session["round"],
-            total=session["total_rounds"],
-            ai_level=session.get("ai_level", "normal"),
+            round=game["round"],
+            total=game["total_rounds"],
+            ai_level=ai_level,
         )
 
 
-@app.route("/api/quiz", methods=["GET"])
+@bp.route("/quiz/stream")
+def quiz_stream():
+    """生成中のクイズをServer-Sent Eventsで送る
+
+    question: 問題文と選択肢がそろった時点（正解は含まない）
+    quiz: 生成が完了し、ゲーム状態に保存された（回答できる）
+    error: 生成に失敗した場合
+    """
+    game_id, game = load_game()
+    pending = game.get("pending_quiz") if game else None
+    quiz_streamer = services.get_quiz_streamer()
+    if not pending or quiz_streamer is None:
+        return jsonify({"error": "生成中のクイズがありません。"}), 404
+
+    # 別のワーカーで開始されたジョブなら、ここで生成し直す（キャッシュがあれば即時）
+    job = quiz_streamer.get(pending["id"]) or quiz_streamer.start(pending["article"])
+
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def events():
+        deadline = time.time() + 60
+        sent_question = False
+        while time.time() < deadline:
+            job.wait(lambda j: j.done or (j.question and not sent_question), timeout=5)
+            if job.question and not sent_question:
+                sent_question = True
+                yield sse("question", job.question)
+            if job.done:
+                break
+            if not sent_question:
+                # 接続維持のためのコメント
+                yield ": ping\n\n"
+
+        if not job.quiz:
+            error = {"error": "クイズの生成に失敗しました。"}
+            if job.retry_after is not None:
+                # 混雑で断られた場合、ブラウザはこの秒数待ってから読み込み直す
+                error["retry_after"] = max(1, math.ceil(job.retry_after))
+            yield sse("error", error)
+            return
+
+        if not sent_question:
+            yield sse("question", {key: job.quiz[key] for key in QUESTION_FIELDS})
+
+        # 回答時に参照できるよう、正解を含むクイズをゲーム状態に保存
+        with metrics.span("game_store.get"):
+            latest = services.get_game_store().get(game_id)
+        if latest and latest.get("pending_quiz", {}).get("id") == pending["id"]:
+            latest["current_quiz"] = attach_article(dict(job.quiz), pending["article"])
+            save_game(game_id, latest)
+        yield sse("quiz", {"ready": True})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@bp.route("/api/quiz", methods=["GET"])
 def api_quiz():
-    quiz_data = quiz_generator.create_quiz()
+    quiz_data = get_quiz()
     if quiz_data:
         return jsonify(
             {
@@ -240,42 +481,119 @@ def api_quiz():
         return jsonify({"error": "クイズの生成に失敗しました。"}), 500
 
 
-@app.route("/result")
+@bp.route("/api/prefetch-stats")
+def api_prefetch_stats():
+    """ゲーム開始時の事前生成の状態をAPIで取得"""
+    quiz_prefetcher = services.get_quiz_prefetcher()
+    if quiz_prefetcher is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **quiz_prefetcher.get_stats()})
+
+
+@bp.route("/api/quiz-pool")
+def api_quiz_pool():
+    """クイズプールの状態をAPIで取得"""
+    quiz_pool = services.get_quiz_pool()
+    if quiz_pool is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **quiz_pool.get_stats()})
+
+
+@bp.route("/api/cache-stats")
+def api_cache_stats():
+    """キャッシュの状態をAPIで取得"""
+    quiz_cache = services.get_quiz_cache()
+    article_index = services.get_article_index()
+    return jsonify(
+        {
+            "quiz_cache": quiz_cache.get_stats() if quiz_cache is not None else None,
+            "http_cache": shared_cache.get_stats(),
+            "article_index": article_index.get_stats() if article_index is not None else None,
+        }
+    )
+
+
+@bp.route("/api/article-stats")
+def api_article_stats():
+    """カテゴリごとの記事の在庫とクロールの状況をAPIで取得"""
+    article_sources = services.get_article_sources()
+    if article_sources is None:
+        return jsonify({"error": "記事の収集が無効になっています。"}), 503
+    return jsonify(article_sources.get_stats())
+
+
+@bp.route("/api/generation-stats")
+def api_generation_stats():
+    """クイズ生成の成功・無駄の割合をAPIで取得"""
+    quiz_generator = services.get_quiz_generator()
+    if quiz_generator is None:
+        return jsonify({"error": "クイズ生成サービスが初期化されていません。"}), 503
+    return jsonify(quiz_generator.get_generation_stats())
+
+
+@bp.route("/api/model-stats")
+def api_model_stats():
+    """Geminiモデルごとのレイテンシ・エラー率・サーキットの状態をAPIで取得"""
+    quiz_generator = services.get_quiz_generator()
+    if quiz_generator is None:
+        return jsonify({"error": "クイズ生成サービスが初期化されていません。"}), 503
+    return jsonify({"models": quiz_generator.get_model_stats()})
+
+
+@bp.route("/api/write-stats")
+def api_write_stats():
+    """Firestore書き込みキューの状態をAPIで取得"""
+    firebase_service = services.get_firebase_service()
+    if firebase_service is None:
+        return jsonify({"enabled": False})
+    return jsonify(firebase_service.get_write_stats())
+
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    """処理フェーズごとの所要時間（Prometheusのテキスト形式）"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/result")
 def result():
     """結果表示ページ"""
-    if "score" not in session:
-        return redirect(url_for("index"))
+    _, game = load_game()
+    if game is None:
+        return redirect(url_for("main.index"))
 
-    ai_level = session.get("ai_level", "normal")
+    firebase_service = services.get_firebase_service()
+    ai_level = game.get("ai_level", "normal")
 
     # ゲーム時間を計算
     game_duration = None
-    if "game_start_time" in session:
-        game_duration = round(time.time() - session["game_start_time"], 2)
+    if "game_start_time" in game:
+        game_duration = round(time.time() - game["game_start_time"], 2)
 
     # 結果をFirebaseに保存（Firebase接続がある場合のみ）
     if firebase_service is not None:
         firebase_service.save_quiz_result(
-            session["score"]["player"],
-            session["score"]["ai"],
-            session["total_rounds"],
+            game["score"]["player"],
+            game["score"]["ai"],
+            game["total_rounds"],
             ai_level,
             game_duration,
         )
 
     return render_template(
         "result.html",
-        player_score=session["score"]["player"],
-        ai_score=session["score"]["ai"],
-        total=session["total_rounds"],
+        player_score=game["score"]["player"],
+        ai_score=game["score"]["ai"],
+        total=game["total_rounds"],
         ai_level=ai_level,
         game_duration=game_duration,
     )
 
 
-@app.route("/stats")
+@bp.route("/stats")
 def stats():
     """統計情報ページ"""
+    firebase_service = services.get_firebase_service()
     # Firebase接続がない場合はデフォルト値を返す
     if firebase_service is None:
         recent_results = []
@@ -290,30 +608,46 @@ def stats():
             "ai_level_distribution": {"strong": 0, "normal": 0, "weak": 0},
         }
     else:
-        recent_results = firebase_service.get_recent_results(limit=20)
+        # キャッシュがない場合に2つの読み取りを待ち合わせないよう並行して実行
+        recent_future = services.get_stats_executor().submit(
+            contextvars.copy_context().run, firebase_service.get_recent_results, limit=20
+        )
         statistics = firebase_service.get_statistics()
+        recent_results = recent_future.result()
 
-    return render_template(
-        "stats.html", recent_results=recent_results, statistics=statistics
+    return cacheable(
+        render_template("stats.html", recent_results=recent_results, statistics=statistics)
     )
 
 
-@app.route("/api/recent-results")
+@bp.route("/api/recent-results")
 def api_recent_results():
     """最近の結果をAPIで取得"""
+    firebase_service = services.get_firebase_service()
     limit = request.args.get("limit", 10, type=int)
     results = firebase_service.get_recent_results(limit=limit)
-    return jsonify(results)
+    return cacheable(jsonify(results))
 
 
-@app.route("/api/statistics")
+@bp.route("/api/statistics")
 def api_statistics():
     """統計情報をAPIで取得"""
+    firebase_service = services.get_firebase_service()
     stats = firebase_service.get_statistics()
-    return jsonify(stats)
+    return cacheable(jsonify(stats))
 
 
-@app.errorhandler(405)
+@bp.cli.command("backfill-stats")
+def backfill_stats():
+    """既存のquiz_resultsから統計の集計ドキュメントを作り直す"""
+    firebase_service = services.get_firebase_service()
+    if firebase_service is None:
+        print("❌ Firebaseが初期化されていません")
+        return
+    print(firebase_service.rebuild_statistics())
+
+
+@bp.app_errorhandler(405)
 def method_not_allowed(error):
     """Method Not Allowed エラーのハンドリング"""
     return (
@@ -324,13 +658,13 @@ def method_not_allowed(error):
     )
 
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     """Not Found エラーのハンドリング"""
     return render_template("error.html", error_message="ページが見つかりません。"), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     """Internal Server Error のハンドリング"""
     return (
@@ -341,6 +675,18 @@ def internal_error(error):
     )
 
 
+def create_app():
+    """Flaskアプリを作る（サービスの初期化は最初のリクエストまで遅らせる）"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SECRET_KEY", "your_secret_key")
+    app.register_blueprint(bp)
+    return app
+
+
+# gunicorn app:app 用
+app = create_app()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=True)
@@ -0,0 +1,211 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from article_extractor import extract_article
+from http_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+TOPICS_URL = "https://news.yahoo.co.jp/topics/business"
+
+_FULL_ARTICLE_STRAINER = SoupStrainer("a", attrs={"data-ual-gotocontent": "true"})
+# 1件の取得の待ち時間の上限（クロールの残り時間がこれより短ければそちらに合わせる）
+REQUEST_TIMEOUT = 10
+
+
+def find_full_article_link(html):
+    """「記事全文を読む」リンクを探す"""
+    soup = BeautifulSoup(html, "html.parser", parse_only=_FULL_ARTICLE_STRAINER)
+    link = soup.find("a")
+    return link.get("href") if link else None
+
+
+class ArticleCrawler:
+    """ニュース一覧の全リンクをasyncioで並行取得し、記事ストアに蓄積する"""
+
+    def __init__(
+        self,
+        store,
+        http=None,
+        topics_url=TOPICS_URL,
+        per_host_limit=4,
+        delay=0.5,
+        time_budget=30,
+        category=None,
+    ):
+        self.store = store
+        self.http = http or shared_cache
+        self.topics_url = topics_url
+        self.per_host_limit = per_host_limit
+        self.delay = delay
+        self.time_budget = time_budget
+        # 収集した記事に付けるカテゴリ名
+        self.category = category
+
+        self._thread = None
+        self._stopped = threading.Event()
+
+        # 統計情報
+        self.last_crawl = None
+
+    # --------------------------
+    # 非同期取得
+    # --------------------------
+    async def _fetch(self, url, semaphores, executor, deadline):
+        """ホストごとの同時接続数と間隔を守って取得
+
+        回数制限の待ちと通信のタイムアウトは、どちらもクロールの残り時間までにする。
+        """
+        host = urlparse(url).netloc
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        async with semaphore:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"クロールの持ち時間を過ぎました: {url}")
+            context = contextvars.copy_context()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    executor,
+                    lambda: context.run(
+                        self.http.get,
+                        url,
+                        timeout=min(REQUEST_TIMEOUT, remaining),
+                        max_wait=remaining,
+                        # 回数制限のトークンは利用者のリクエストに譲る
+                        background=True,
+                    ),
+                )
+            finally:
+                # 同じホストへ連続でアクセスしないよう待つ
+                await asyncio.sleep(self.delay)
+
+    async def _crawl_article(self, url, semaphores, executor, deadline):
+        """記事ページ→全文ページの順に辿って記事を取得"""
+        source_url = url
+        html = await self._fetch(url, semaphores, executor, deadline)
+        full_url = find_full_article_link(html)
+        if full_url:
+            url = urljoin(url, full_url)
+            html = await self._fetch(url, semaphores, executor, deadline)
+        article = extract_article(html, url)
+        article["source_url"] = source_url
+        if self.category is not None:
+            article["category"] = self.category
+        return article
+
+    async def crawl(self):
+        """1回分のクロール。ストアに追加した記事数を返す
+
+        time_budget 秒を過ぎたら終わっていない取得を待たずに戻る。
+        取得は専用のスレッドで行い、終了時に待たない（asyncio.run の既定の
+        エグゼキューターだと、残った取得が終わるまで戻れない）。
+        """
+        # ホストは一覧と記事の2つ程度なので、ホストごとの上限の2倍あれば足りる
+        executor = ThreadPoolExecutor(
+            max_workers=self.per_host_limit * 2, thread_name_prefix="crawler-fetch"
+        )
+        try:
+            return await self._crawl(executor)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _crawl(self, executor):
+        started = time.time()
+        deadline = started + self.time_budget
+        semaphores = {}
+
+        html = await self._fetch(self.topics_url, semaphores, executor, deadline)
+        soup = BeautifulSoup(
+            html, "html.parser", parse_only=SoupStrainer("ul", class_="newsFeed_list")
+        )
+        news_feed = soup.find("ul")
+        links = [a.get("href") for a in news_feed.find_all("a")] if news_feed else []
+        urls = [
+            urljoin(self.topics_url, href)
+            for href in dict.fromkeys(links)
+            if href and not self.store.has(urljoin(self.topics_url, href))
+        ]
+
+        tasks = [
+            asyncio.create_task(self._crawl_article(url, semaphores, executor, deadline))
+            for url in urls
+        ]
+        added = 0
+        failed = 0
+        pending = ()
+        if tasks:
+            remaining = max(0, deadline - time.time())
+            done, pending = await asyncio.wait(tasks, timeout=remaining)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                if task.exception():
+                    failed += 1
+                elif self.store.add(task.result()):
+                    added += 1
+
+        self.last_crawl = {
+            "links": len(urls),
+            "added": added,
+            "failed": failed,
+            "timed_out": len(pending),
+            "duration": round(time.time() - started, 2),
+            "finished_at": time.time(),
+        }
+        logger.info(
+            "%d件中%d件の記事を収集しました (%s秒)",
+            len(urls),
+            added,
+            self.last_crawl["duration"],
+            extra={"crawl": self.last_crawl},
+        )
+        return added
+
+    def crawl_once(self):
+        """同期的に1回クロール"""
+        try:
+            return asyncio.run(self.crawl())
+        except Exception as e:
+            logger.error("クロールエラー - %s", e)
+            return 0
+
+    # --------------------------
+    # バックグラウンド実行
+    # --------------------------
+    def start(self, interval=300, low_water=10, initial_delay=0):
+        """ストアの在庫が少なくなったら定期的にクロールするスレッドを起動"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+
+        def loop():
+            self._stopped.wait(initial_delay)
+            while not self._stopped.is_set():
+                if len(self.store) < low_water:
+                    self.crawl_once()
+                self._stopped.wait(interval)
+
+        self._thread = threading.Thread(
+            target=loop, name=f"article-crawler-{self.category or 'default'}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+
+if __name__ == "__main__":
+    from article_store import ArticleStore
+
+    store = ArticleStore()
+    crawler = ArticleCrawler(store)
+    crawler.crawl_once()
+    print(crawler.last_crawl)
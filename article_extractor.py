@@ -0,0 +1,58 @@
+from html import unescape
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 記事本文として読み込む最大バイト数（本文のdiv開始位置から数える）
+MAX_BODY_BYTES = 64 * 1024
+MAX_CONTENT_CHARS = 2000
+
+_BODY_STRAINER = SoupStrainer("div", class_="article_body")
+_PARAGRAPH_STRAINER = SoupStrainer(["p", "h2"])
+_BODY_START_PATTERN = re.compile(r"<div[^>]*class=\"[^\"]*\barticle_body\b")
+_H1_PATTERN = re.compile(r"<h1[^>]*>(.*?)</h1>", re.S)
+_TAG_PATTERN = re.compile(r"<[^>]+>")
+
+
+def extract_title(html):
+    """h1の中身を正規表現で取り出す（ページ全体はパースしない）"""
+    match = _H1_PATTERN.search(html)
+    if not match:
+        return "タイトルなし"
+    # BeautifulSoup の .text と同じく文字参照（&amp; 等）を戻す
+    title = unescape(_TAG_PATTERN.sub("", match.group(1))).strip()
+    return title or "タイトルなし"
+
+
+def _join_paragraphs(soup):
+    paragraphs = soup.find_all(["p", "h2"])
+    return " ".join(p.get_text().strip() for p in paragraphs if p.get_text().strip())
+
+
+def extract_body(html, max_bytes=MAX_BODY_BYTES, max_chars=MAX_CONTENT_CHARS):
+    """記事本文を抽出し、(本文, 抽出方法)を返す
+
+    1. div.article_body 以降の max_bytes だけを SoupStrainer でパース
+    2. 見つからなければ先頭 max_bytes の p/h2 だけをパース
+    3. それでも空ならページ全体の get_text()（従来の方法）
+    """
+    match = _BODY_START_PATTERN.search(html)
+    if match:
+        chunk = html[match.start() : match.start() + max_bytes]
+        soup = BeautifulSoup(chunk, "html.parser", parse_only=_BODY_STRAINER)
+        content = _join_paragraphs(soup)
+        if content:
+            return content[:max_chars], "article_body"
+
+    soup = BeautifulSoup(html[:max_bytes], "html.parser", parse_only=_PARAGRAPH_STRAINER)
+    content = _join_paragraphs(soup)
+    if content:
+        return content[:max_chars], "paragraphs"
+
+    return BeautifulSoup(html, "html.parser").get_text()[:max_chars], "full_text"
+
+
+def extract_article(html, url, max_bytes=MAX_BODY_BYTES, max_chars=MAX_CONTENT_CHARS):
+    """記事ページから本文・タイトルを抽出"""
+    content, _ = extract_body(html, max_bytes=max_bytes, max_chars=max_chars)
+    return {"content": content, "url": url, "title": extract_title(html)}
@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# 64ビットのSimHashを8ビットずつ8つに分けて索引にする。
+# ハミング距離7以内なら、鳩の巣原理で少なくとも1つのバンドが完全に一致する
+BANDS = 8
+BAND_BITS = 64 // BANDS
+MAX_DISTANCE = BANDS - 1
+SHINGLE_SIZE = 3
+# 見出しや配信元の一文が違う程度（本文の1割前後の差）を重複とみなす
+DEFAULT_DISTANCE = 6
+
+
+def canonical_url(url):
+    """クエリ・フラグメント・末尾のスラッシュを除いたURL（同じ記事の別表記をまとめる）"""
+    parts = urlsplit(url or "")
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), "", "")
+    )
+
+
+def _hash(shingle):
+    return hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+
+
+def simhash(text, size=SHINGLE_SIZE):
+    """本文の文字 n-gram から64ビットのSimHashを計算
+
+    日本語は単語の区切りがないため、空白を除いた文字の n-gram を使う。
+    """
+    text = "".join(text.split())
+    shingles = {text[i : i + size] for i in range(max(1, len(text) - size + 1))}
+    # 各 n-gram のハッシュを64桁の2進数の文字列にし、桁ごとに1の数を数える
+    bits = "".join(
+        format(int.from_bytes(_hash(shingle), "big"), "064b") for shingle in shingles
+    )
+    half = len(shingles) / 2
+    fingerprint = 0
+    for position in range(64):
+        if bits[position::64].count("1") > half:
+            fingerprint |= 1 << (63 - position)
+    return fingerprint
+
+
+def _bands(fingerprint):
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (BAND_BITS * i)) & mask for i in range(BANDS)]
+
+
+def _to_signed(value):
+    """SQLiteのINTEGERは符号付き64ビットのため変換する"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class ArticleIndex:
+    """収集・出題した記事の索引（正規化したURLと本文のSimHash）
+
+    同じニュースが複数の配信元から届いても、window 秒以内に出題した記事と
+    本文がほぼ同じ（SimHashのハミング距離が max_distance 以内）なら重複とみなす。
+    gunicornの複数ワーカーや再起動をまたいで共有できるよう、SQLiteに保存する。
+    max_age 秒より古い記事は削除する。
+    """
+
+    def __init__(
+        self,
+        path="article_index.sqlite3",
+        window=24 * 3600,
+        max_age=7 * 24 * 3600,
+        max_distance=DEFAULT_DISTANCE,
+    ):
+        if max_distance > MAX_DISTANCE:
+            raise ValueError(f"max_distance は{MAX_DISTANCE}以下にしてください")
+        self.path = path
+        self.window = window
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self._local = threading.local()
+
+        # 統計情報（プロセス単位）
+        self.checks = 0
+        self.duplicates = 0
+
+        conn = self._connect()
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS article_index (
+                url TEXT PRIMARY KEY,
+                fingerprint INTEGER NOT NULL,
+                {", ".join(f"band{i} INTEGER NOT NULL" for i in range(BANDS))},
+                title TEXT,
+                seen_at REAL NOT NULL,
+                used_at REAL
+            )
+            """
+        )
+        for i in range(BANDS):
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS article_index_band{i} ON article_index (band{i})"
+            )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS article_index_seen_at ON article_index (seen_at)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        """スレッドごとに接続を持つ（fork後は作り直す）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def fingerprint(article):
+        """記事のSimHash（一度計算したら記事に持たせておく）"""
+        if "simhash" not in article:
+            article["simhash"] = simhash(article.get("content", ""))
+        return article["simhash"]
+
+    def find_duplicate(self, article, used_only=False):
+        """window 秒以内に出題した同じURLの記事か、記録した本文がほぼ同じ別のURLの記事を返す
+
+        同じURLは出題済みのときだけ重複とする（再起動後や別のワーカーが同じ記事を
+        収集し直すのは妨げない）。used_only=True なら本文の比較も出題済みの記事だけにする。
+        なければNone。
+        """
+        fingerprint = self.fingerprint(article)
+        urls = {canonical_url(article[key]) for key in ("url", "source_url") if article.get(key)}
+        since = time.time() - self.window
+        column = "used_at" if used_only else "seen_at"
+        conn = self._connect()
+
+        for url in urls:
+            row = conn.execute(
+                "SELECT url, title FROM article_index WHERE url = ? AND used_at >= ?",
+                (url, since),
+            ).fetchone()
+            if row:
+                return {"url": row[0], "title": row[1], "distance": 0}
+
+        bands = _bands(fingerprint)
+        rows = conn.execute(
+            f"""
+            SELECT url, title, fingerprint FROM article_index
+            WHERE ({" OR ".join(f"band{i} = ?" for i in range(BANDS))}) AND {column} >= ?
+            """,
+            (*bands, since),
+        ).fetchall()
+        for url, title, other in rows:
+            if url in urls:
+                continue
+            distance = (fingerprint ^ (other & ((1 << 64) - 1))).bit_count()
+            if distance <= self.max_distance:
+                return {"url": url, "title": title, "distance": distance}
+        return None
+
+    def _record(self, conn, article, used):
+        now = time.time()
+        fingerprint = self.fingerprint(article)
+        for key in ("url", "source_url"):
+            if not article.get(key):
+                continue
+            conn.execute(
+                f"""
+                INSERT INTO article_index VALUES (?, ?, {", ".join("?" * BANDS)}, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    seen_at = excluded.seen_at,
+                    used_at = COALESCE(excluded.used_at, used_at)
+                """,
+                (
+                    canonical_url(article[key]),
+                    _to_signed(fingerprint),
+                    *_bands(fingerprint),
+                    article.get("title"),
+                    now,
+                    now if used else None,
+                ),
+            )
+        conn.execute("DELETE FROM article_index WHERE seen_at < ?", (now - self.max_age,))
+
+    def _check_and_record(self, article, used):
+        """重複でなければ記録する。重複なら重複先の記事を返す"""
+        self.checks += 1
+        conn = self._connect()
+        # 複数のワーカーが同時に同じニュースを記録しないよう、先に書き込みロックを取る
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            duplicate = self.find_duplicate(article, used_only=used)
+            if duplicate is None:
+                self._record(conn, article, used)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if duplicate is not None:
+            self.duplicates += 1
+            logger.info(
+                "%s記事と重複しています: %s",
+                "出題済みの" if used else "収集済みの",
+                article.get("url"),
+                extra={"duplicate_of": duplicate["url"], "distance": duplicate["distance"]},
+            )
+        return duplicate
+
+    def add(self, article):
+        """収集した記事を記録する。出題済みの記事か、別のURLで収集済みのほぼ同じ記事ならFalse"""
+        try:
+            return self._check_and_record(article, used=False) is None
+        except Exception as e:
+            logger.error("記録エラー - %s", e)
+            return True
+
+    def claim(self, article):
+        """出題に使う記事を記録する。最近出題した記事の重複ならFalse（記録しない）"""
+        try:
+            return self._check_and_record(article, used=True) is None
+        except Exception as e:
+            logger.error("記録エラー - %s", e)
+            return True
+
+    def get_stats(self):
+        """記録している記事数と重複で除外した割合を取得"""
+        entries, used = 0, 0
+        try:
+            entries, used = self._connect().execute(
+                "SELECT COUNT(*), COUNT(used_at) FROM article_index"
+            ).fetchone()
+        except Exception as e:
+            logger.error("統計取得エラー - %s", e)
+        return {
+            "entries": entries,
+            "used": used,
+            "checks": self.checks,
+            "duplicates": self.duplicates,
+            "duplicate_rate": (
+                round(self.duplicates / self.checks * 100, 1) if self.checks > 0 else 0
+            ),
+        }
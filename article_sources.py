@@ -0,0 +1,137 @@
+import random
+import threading
+from urllib.parse import urljoin
+
+from article_crawler import ArticleCrawler, TOPICS_URL
+from article_store import ArticleStore
+
+# Yahoo!ニュースのトピックス（URLの末尾 → 表示名）
+CATEGORY_LABELS = {
+    "top-picks": "主要",
+    "domestic": "国内",
+    "world": "国際",
+    "business": "経済",
+    "entertainment": "エンタメ",
+    "sports": "スポーツ",
+    "it": "IT",
+    "science": "科学",
+    "life": "ライフ",
+    "local": "地域",
+}
+# カテゴリ:重み[:クロール間隔（秒）] のカンマ区切り
+DEFAULT_CATEGORIES = "business:3,domestic:2,world:2,it:1,science:1"
+
+
+def parse_categories(spec, default_interval=300):
+    """ "business:3,it:1:600" → [(名前, 重み, 間隔), ...] """
+    categories = []
+    for item in (spec or "").split(","):
+        parts = [part.strip() for part in item.split(":")]
+        if not parts[0]:
+            continue
+        weight = float(parts[1]) if len(parts) > 1 and parts[1] else 1.0
+        interval = int(parts[2]) if len(parts) > 2 and parts[2] else default_interval
+        if weight > 0:
+            categories.append((parts[0], weight, interval))
+    return categories
+
+
+def category_url(name, topics_url=TOPICS_URL):
+    """トピック一覧のURLのカテゴリ部分を name に置き換える"""
+    return urljoin(topics_url, name)
+
+
+class ArticleSources:
+    """カテゴリごとに記事を収集・保持し、在庫のあるカテゴリから重みに応じて選ぶ
+
+    カテゴリごとに別のストアとクローラー（スレッド）を持つため、
+    一覧ページが遅い・空のカテゴリがあっても他のカテゴリには影響しない。
+    """
+
+    def __init__(self, categories, topics_url=TOPICS_URL, index=None, **crawler_options):
+        # categories: [(名前, 重み, クロール間隔（秒）), ...]
+        self.weights = {}
+        self.intervals = {}
+        self.stores = {}
+        self.crawlers = {}
+        for name, weight, interval in categories:
+            self.weights[name] = weight
+            self.intervals[name] = interval
+            self.stores[name] = ArticleStore(index=index)
+            self.crawlers[name] = ArticleCrawler(
+                self.stores[name],
+                topics_url=category_url(name, topics_url),
+                category=name,
+                **crawler_options,
+            )
+        self._lock = threading.Lock()
+        self._started = False
+
+        # 統計情報
+        self.taken = {name: 0 for name in self.stores}
+        self.empty = 0
+
+    @property
+    def categories(self):
+        """[(名前, 表示名), ...]（設定の順）"""
+        return [(name, CATEGORY_LABELS.get(name, name)) for name in self.stores]
+
+    def start(self, low_water=10):
+        """カテゴリごとのクロールを起動（一斉にアクセスしないよう開始をずらす）"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        count = len(self.crawlers)
+        for i, (name, crawler) in enumerate(self.crawlers.items()):
+            interval = self.intervals[name]
+            crawler.start(
+                interval=interval,
+                low_water=low_water,
+                initial_delay=min(interval, 30) * i / max(count, 1),
+            )
+
+    def stop(self):
+        with self._lock:
+            self._started = False
+        for crawler in self.crawlers.values():
+            crawler.stop()
+
+    def take(self, category=None):
+        """在庫のあるカテゴリから重みに応じて1件取り出す。なければNone
+
+        category を指定するとそのカテゴリからだけ取り出す。
+        """
+        candidates = [category] if category is not None else list(self.stores)
+        while True:
+            stocked = [name for name in candidates if len(self.stores.get(name, ()))]
+            if not stocked:
+                self.empty += 1
+                return None
+            name = random.choices(stocked, [self.weights[name] for name in stocked])[0]
+            article = self.stores[name].take()
+            if article:
+                self.taken[name] += 1
+                return article
+            # 他のスレッドが先に取り出した・期限切れだった
+            candidates = [other for other in stocked if other != name]
+
+    def __len__(self):
+        return sum(len(store) for store in self.stores.values())
+
+    def get_stats(self):
+        """カテゴリごとの在庫・重み・直近のクロール結果を取得"""
+        return {
+            "categories": {
+                name: {
+                    "label": CATEGORY_LABELS.get(name, name),
+                    "weight": self.weights[name],
+                    "interval": self.intervals[name],
+                    "stock": len(self.stores[name]),
+                    "taken": self.taken[name],
+                    "last_crawl": self.crawlers[name].last_crawl,
+                }
+                for name in self.stores
+            },
+            "empty": self.empty,
+        }
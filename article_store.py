@@ -0,0 +1,68 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+class ArticleStore:
+    """クローラーが収集した記事をクイズ生成用に保持するストア"""
+
+    def __init__(self, max_articles=200, max_age=3600, index=None):
+        self.max_articles = max_articles
+        self.max_age = max_age
+        # 別の配信元から届いた同じニュースを除くための索引（ArticleIndex、Noneなら使わない）
+        self.index = index
+        self._articles = OrderedDict()  # url -> 記事(dict)
+        self._known = OrderedDict()  # 収集済みのurl（再収集防止）
+        self._lock = threading.Lock()
+
+    def _evict_expired(self):
+        """ロック取得中に呼び出すこと"""
+        now = time.time()
+        for url in list(self._articles):
+            if now - self._articles[url]["fetched_at"] > self.max_age:
+                del self._articles[url]
+        for url in list(self._known):
+            if now - self._known[url] <= self.max_age:
+                break
+            del self._known[url]
+
+    def has(self, url):
+        """収集済み・出題済みのURLかどうか"""
+        with self._lock:
+            return url in self._known
+
+    def add(self, article):
+        """記事を追加（content, url, titleを含むdict）"""
+        if not article or not article.get("content"):
+            return False
+        with self._lock:
+            if article["url"] in self._known:
+                return False
+            article.setdefault("fetched_at", time.time())
+            # 一覧ページ上のリンクと全文ページのURLの両方を記録
+            for url in (article["url"], article.get("source_url")):
+                if url:
+                    self._known[url] = article["fetched_at"]
+                    self._known.move_to_end(url)
+        # 索引はSQLiteなので、ロックの外で調べる
+        if self.index is not None and not self.index.add(article):
+            return False
+        with self._lock:
+            self._articles[article["url"]] = article
+            while len(self._articles) > self.max_articles:
+                self._articles.popitem(last=False)
+            return True
+
+    def take(self):
+        """記事をランダムに1件取り出す。なければNone"""
+        with self._lock:
+            self._evict_expired()
+            if not self._articles:
+                return None
+            url = random.choice(list(self._articles))
+            return self._articles.pop(url)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._articles)
@@ -0,0 +1,75 @@
+"""記事本文抽出のベンチマーク
+
+memo.txt（Yahoo!ニュースの記事本文部分のキャプチャ）を元に記事ページを組み立て、
+従来の全体パース（get_text()[:2000]）と article_extractor を比較する。
+
+    python benchmarks/bench_extract.py [繰り返し回数]
+"""
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from article_extractor import extract_article  # noqa: E402
+
+
+def build_fixtures():
+    """memo.txtの前後にナビゲーション等を付けた記事ページを作る"""
+    body = (ROOT / "memo.txt").read_text(encoding="utf-8")
+    nav = "".join(
+        f'<li><a href="https://news.yahoo.co.jp/categories/{i}">カテゴリ{i}</a></li>'
+        for i in range(200)
+    )
+    header = (
+        "<html><head><title>記事</title><script>window.__PRELOADED_STATE__ = {};</script></head>"
+        f"<body><header><ul>{nav}</ul></header><h1>ライドシェア全面解禁へ</h1><main>"
+    )
+    footer = f"</main><footer><ul>{nav}</ul></footer></body></html>"
+    return {
+        "memo": body,
+        "page": header + body + footer,
+        # セレクタが変わった場合（フォールバック経路）
+        "no_article_body": header + body.replace("article_body", "renamed_body") + footer,
+    }
+
+
+def legacy_extract(html, url):
+    """従来の get_news_article と同じ処理"""
+    soup = BeautifulSoup(html, "html.parser")
+    content = soup.get_text()[:2000]
+    title = soup.find("h1").text if soup.find("h1") else "タイトルなし"
+    return {"content": content, "url": url, "title": title}
+
+
+def measure(func, html, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html, "https://example.com")
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func(html, "https://example.com")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'fixture':<18}{'method':<10}{'median(ms)':>12}{'peak(KB)':>12}")
+    for name, html in build_fixtures().items():
+        for label, func in (("legacy", legacy_extract), ("strainer", extract_article)):
+            median, peak = measure(func, html, repeat)
+            print(f"{name:<18}{label:<10}{median * 1000:>12.2f}{peak / 1024:>12.1f}")
+        print(f"  本文冒頭: {extract_article(html, '')['content'][:40]}...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""プロンプトのトークン数の比較（記事本文をそのまま送る場合と PromptBuilder で絞った場合）
+
+Yahoo!ニュースのスタブの記事ページと memo.txt から本文を抽出し、
+QUIZ_JSON_PROMPT に入れたときの入力トークン数の分布（p50/p90/最大）を出力する。
+--gemini を付けると GEMINI_API_KEY のモデルの count_tokens で数える（既定は見積もり）。
+
+    python benchmarks/bench_prompt.py [--articles 100] [--budget 300,500,800] [--gemini]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from article_extractor import extract_article  # noqa: E402
+from bench_extract import build_fixtures  # noqa: E402
+from honban import QUIZ_JSON_PROMPT  # noqa: E402
+from loadtest.yahoo_stub import YahooStub  # noqa: E402
+from prompt_builder import PromptBuilder, TokenCounter  # noqa: E402
+
+
+def load_articles(count):
+    """スタブの記事ページ（サーバーは起動せずにHTMLだけ作る）と memo.txt の本文"""
+    stub = YahooStub()
+    try:
+        articles = [
+            extract_article(stub.article_page(number), f"/articles/{number}")["content"]
+            for number in range(count)
+        ]
+    finally:
+        # serve_forever していないので shutdown は呼ばない
+        stub._server.server_close()
+    articles.append(extract_article(build_fixtures()["page"], "memo")["content"])
+    return articles
+
+
+def create_counter(use_gemini):
+    if not use_gemini:
+        return TokenCounter()
+    import google.generativeai as genai
+
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    return TokenCounter(genai.GenerativeModel(os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")))
+
+
+def distribution(values):
+    values = sorted(values)
+    return {
+        "p50": values[len(values) // 2],
+        "p90": values[min(len(values) - 1, int(len(values) * 0.9))],
+        "max": values[-1],
+        "mean": round(statistics.mean(values), 1),
+    }
+
+
+def print_row(label, stats, extra=""):
+    print(
+        f"  {label:<14}{stats['p50']:>8}{stats['p90']:>8}{stats['max']:>8}{stats['mean']:>10}{extra}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=100, help="スタブの記事数")
+    parser.add_argument("--budget", default="300,500,800", help="比べる予算（カンマ区切り）")
+    parser.add_argument("--gemini", action="store_true", help="Geminiの count_tokens で数える")
+    args = parser.parse_args()
+
+    articles = load_articles(args.articles)
+    counter = create_counter(args.gemini)
+    print(
+        f"{len(articles)}記事、{'count_tokens' if args.gemini else '見積もり'}で計測"
+        "（プロンプト全体の入力トークン数）"
+    )
+    print(f"  {'':<14}{'p50':>8}{'p90':>8}{'max':>8}{'mean':>10}")
+
+    before = [counter.count(QUIZ_JSON_PROMPT.format(text=text)) for text in articles]
+    print_row("本文そのまま", distribution(before))
+
+    for budget in (int(value) for value in args.budget.split(",")):
+        builder = PromptBuilder(counter, budget=budget)
+        started = time.perf_counter()
+        bodies = [builder.build(text) for text in articles]
+        elapsed = (time.perf_counter() - started) / len(articles) * 1000
+        after = [counter.count(QUIZ_JSON_PROMPT.format(text=body)) for body in bodies]
+        reduction = (1 - sum(after) / sum(before)) * 100
+        print_row(
+            f"予算 {budget}",
+            distribution(after),
+            f"   -{reduction:.0f}%  構築 {elapsed:.2f} ms/記事",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""起動時間のベンチマーク
+
+新しいプロセスで app をimportする時間、最初のリクエスト（/）を返すまでの時間、
+ゲームを作って最初のクイズ（/quiz）を返すまでの時間を計測する。
+/ はサービスを初期化しないため、初期化の遅延の効果は /quiz の時間で見る。
+Geminiとニュースは負荷試験用の代替（遅延0）を使う。
+比較したい別のチェックアウトのパスを引数で渡せる。
+
+    python benchmarks/bench_startup.py [リポジトリのパス] [繰り返し回数]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from loadtest.yahoo_stub import YahooStub  # noqa: E402
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.app if hasattr(app_module, "app") else app_module.create_app()
+client = flask_app.test_client()
+response = client.get("/")
+first_request = time.perf_counter()
+heavy = [name for name in ("google.generativeai", "firebase_admin", "grpc") if name in sys.modules]
+client.post("/game", data={"ai_level": "normal"})
+quiz_response = client.get("/quiz")
+first_quiz = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "first_request": first_request - started,
+    "first_quiz": first_quiz - started,
+    "status": response.status_code,
+    "quiz_status": quiz_response.status_code,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_once(repo, stub):
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark-dummy-key")
+    env["PYTHONPATH"] = str(repo)
+    # 生成・取得の待ち時間ではなく初期化の時間を測るため、遅延のない代替を使う
+    env.update(
+        {
+            "LOADTEST": "1",
+            "YAHOO_TOPICS_URL": stub.topics_url,
+            "FAKE_GEMINI_LATENCY_MEDIAN": "0",
+            "FAKE_GEMINI_ERROR_RATE": "0",
+            "FAKE_GEMINI_MALFORMED_RATE": "0",
+            "ARTICLE_CRAWLER_ENABLED": "0",
+        }
+    )
+    # キャッシュ等のファイルはテンポラリに作らせる
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=workdir,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    repo = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else ROOT
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    stub = YahooStub()
+    stub.start()
+    try:
+        runs = [run_once(repo, stub) for _ in range(repeat)]
+    finally:
+        stub.stop()
+    result = {
+        "repo": str(repo),
+        "import_ms": round(statistics.median(r["import"] for r in runs) * 1000, 1),
+        "first_request_ms": round(statistics.median(r["first_request"] for r in runs) * 1000, 1),
+        "first_quiz_ms": round(statistics.median(r["first_quiz"] for r in runs) * 1000, 1),
+        "status": runs[-1]["status"],
+        "quiz_status": runs[-1]["quiz_status"],
+        "heavy_modules_loaded": runs[-1]["heavy_modules"],
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""クイズ生成パイプラインのCPU処理のベンチマーク（ネットワーク・Gemini不要）
+
+- extract: 記事ページ・トピック一覧のパースと本文抽出、重複判定用のSimHash（memo.txtから組み立てたページ）
+- parse: Geminiの応答パーサー（fixtures/gemini_responses.json の正常・異常な応答）
+- statistics: 統計の集計（quiz_resultsの全件集計 1千〜100万件と、集計ドキュメントの合算）
+- render: quiz.html / stats.html のJinjaレンダリング
+
+結果はJSONで保存し、--compare で以前の結果と比べられる。
+
+    python benchmarks/bench_suite.py [--quick] [--only extract,parse] [--output 結果.json]
+    python benchmarks/bench_suite.py --compare benchmarks/results/<以前のコミット>.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+from bs4 import BeautifulSoup, SoupStrainer  # noqa: E402
+
+import honban  # noqa: E402
+from article_extractor import extract_article  # noqa: E402
+from article_index import simhash  # noqa: E402
+from bench_extract import build_fixtures  # noqa: E402
+from firebase_service import FirebaseService, STATS_SHARDS  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+STAT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def measure(func, repeat, min_time=0.2):
+    """func() を repeat 回（短い処理は min_time 秒以上になるまで）実行し、中央値などを返す"""
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat or (time.perf_counter() - started < min_time and len(times) < 10000):
+        t = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t)
+    times.sort()
+    return {
+        "runs": len(times),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "p90_ms": round(times[min(len(times) - 1, int(len(times) * 0.9))] * 1000, 4),
+        "min_ms": round(times[0] * 1000, 4),
+    }
+
+
+# --------------------------
+# 記事ページのパース・本文抽出
+# --------------------------
+def build_topics_page():
+    """トピック一覧ページ（newsFeed_list に記事リンク25件＋周囲のナビゲーション）"""
+    nav = "".join(f'<li><a href="/categories/{i}">カテゴリ{i}</a></li>' for i in range(300))
+    items = "".join(
+        f'<li class="newsFeed_item"><a href="https://news.yahoo.co.jp/pickup/{i}">'
+        f"<div class=\"newsFeed_item_title\">ニュース見出し{i}</div></a></li>"
+        for i in range(25)
+    )
+    return (
+        f"<html><body><header><ul>{nav}</ul></header>"
+        f'<ul class="newsFeed_list">{items}</ul><footer><ul>{nav}</ul></footer></body></html>'
+    )
+
+
+def bench_extract(repeat):
+    results = {}
+    for name, html in build_fixtures().items():
+        results[f"extract_article/{name}"] = measure(
+            lambda html=html: extract_article(html, "https://example.com"), repeat
+        )
+
+    # 重複判定用の本文のSimHash（抽出後の本文の上限 2000文字）
+    content = extract_article(build_fixtures()["memo"], "https://example.com")["content"]
+    results["simhash"] = measure(lambda: simhash(content), repeat)
+
+    topics = build_topics_page()
+
+    def parse_topics():
+        soup = BeautifulSoup(
+            topics, "html.parser", parse_only=SoupStrainer("ul", class_="newsFeed_list")
+        )
+        return soup.find("ul").find_all("a")
+
+    results["topics_links"] = measure(parse_topics, repeat)
+    return results
+
+
+# --------------------------
+# Geminiの応答パーサー
+# --------------------------
+PARSERS = {
+    "text": honban.parse_quiz_text,
+    "json": honban.parse_quiz_json,
+    "text_batch": honban.parse_quiz_batch,
+    "json_batch": honban.parse_quiz_batch_json,
+}
+
+
+def count_valid(parser, result):
+    if parser.endswith("_batch"):
+        return len(result)
+    return 1 if result else 0
+
+
+def bench_parse(repeat):
+    corpus = json.loads((BENCH_DIR / "fixtures" / "gemini_responses.json").read_text("utf-8"))
+    results = {}
+    for entry in corpus:
+        parser = PARSERS[entry["parser"]]
+        valid = count_valid(entry["parser"], parser(entry["text"]))
+        if valid != entry["valid"]:
+            # 速さ以前にパース結果が変わっていれば知らせる
+            print(f"⚠️ {entry['name']}: 正しいクイズ {valid}件（期待値 {entry['valid']}件）")
+        result = measure(lambda parser=parser, text=entry["text"]: parser(text), repeat)
+        result["valid"] = valid
+        results[f"{entry['parser']}/{entry['name']}"] = result
+    return results
+
+
+# --------------------------
+# 統計の集計
+# --------------------------
+class FakeDoc:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def stream(self):
+        return iter(self._docs)
+
+
+class FakeDB:
+    """FirebaseServiceの集計処理が使う collection(...).stream() だけを持つ"""
+
+    def __init__(self, collections):
+        self._collections = collections
+
+    def collection(self, name):
+        return FakeCollection(self._collections.get(name, []))
+
+
+def synthetic_results(count, seed=0):
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(count):
+        player, ai = rng.randint(0, 5), rng.randint(0, 5)
+        winner = "player" if player > ai else "ai" if ai > player else "draw"
+        docs.append(
+            FakeDoc(
+                {
+                    "player_score": player,
+                    "ai_score": ai,
+                    "total_rounds": 5,
+                    "ai_level": rng.choice(["strong", "normal", "weak"]),
+                    "winner": winner,
+                    "game_duration": rng.uniform(30, 120),
+                }
+            )
+        )
+    return docs
+
+
+def bench_statistics(repeat, sizes):
+    results = {}
+    service = FirebaseService.__new__(FirebaseService)
+    for size in sizes:
+        service.db = FakeDB({"quiz_results": synthetic_results(size)})
+        results[f"scan_totals/{size}"] = measure(
+            lambda: service._build_statistics(service._scan_totals()),
+            max(1, repeat // max(1, size // 10_000)),
+            min_time=0,
+        )
+
+    # 集計ドキュメント（シャード）を合算する通常の経路
+    shards = [
+        FakeDoc(
+            {
+                "total_games": 100,
+                "player_wins": 40,
+                "ai_wins": 50,
+                "draws": 10,
+                "total_player_score": 250,
+                "total_ai_score": 270,
+                "ai_level_distribution": {"strong": 30, "normal": 40, "weak": 30},
+            }
+        )
+        for _ in range(STATS_SHARDS)
+    ]
+    service.db = FakeDB({"stats_aggregates": shards})
+    results["aggregate_totals"] = measure(
+        lambda: service._build_statistics(service._read_aggregate_totals()), repeat
+    )
+    return results
+
+
+# --------------------------
+# テンプレートのレンダリング
+# --------------------------
+def bench_render(repeat):
+    from flask import Flask, render_template
+
+    app = Flask(__name__, template_folder=str(ROOT / "templates"))
+    article = build_fixtures()["memo"][:2000]
+    quiz = {
+        "question": "日本銀行が発表した政策金利の引き上げ幅はどれか？",
+        "choice_a": "0.1%",
+        "choice_b": "0.25%",
+        "choice_c": "0.5%",
+        "choice_d": "1.0%",
+    }
+    recent_results = [
+        {
+            "player_score": i % 6,
+            "ai_score": (i * 7) % 6,
+            "total_rounds": 5,
+            "ai_level": "normal",
+            "winner": "player",
+            "game_duration": 61.5,
+            "timestamp": "2026-10-01T12:34:56.000000",
+        }
+        for i in range(20)
+    ]
+    statistics_data = FirebaseService._build_statistics(
+        {
+            "total_games": 1000,
+            "player_wins": 400,
+            "ai_wins": 500,
+            "draws": 100,
+            "total_player_score": 2500,
+            "total_ai_score": 2700,
+            "ai_level_distribution": {"strong": 300, "normal": 400, "weak": 300},
+        }
+    )
+
+    results = {}
+    with app.test_request_context():
+        results["quiz.html/question"] = measure(
+            lambda: render_template(
+                "quiz.html",
+                **quiz,
+                article_content=article,
+                article_url="https://example.com",
+                article_title="記事",
+                round=1,
+                total=5,
+                ai_level="normal",
+                ai_thinking="データを分析中...",
+            ),
+            repeat,
+        )
+        results["quiz.html/stream"] = measure(
+            lambda: render_template(
+                "quiz.html",
+                stream_url="/quiz/stream",
+                article_content=article,
+                article_url="https://example.com",
+                article_title="記事",
+                round=1,
+                total=5,
+                ai_level="normal",
+                ai_thinking="データを分析中...",
+            ),
+            repeat,
+        )
+        results["stats.html"] = measure(
+            lambda: render_template(
+                "stats.html", recent_results=recent_results, statistics=statistics_data
+            ),
+            repeat,
+        )
+    return results
+
+
+# --------------------------
+# 実行・保存・比較
+# --------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current, baseline_path):
+    """以前の結果と中央値を比べて表示"""
+    baseline = json.loads(Path(baseline_path).read_text("utf-8"))
+    print(f"\n比較: {baseline['commit']} → {current['commit']}（中央値、+は遅くなった）")
+    for group, cases in current["results"].items():
+        for name, result in cases.items():
+            before = baseline["results"].get(group, {}).get(name)
+            if not before or not before["median_ms"]:
+                continue
+            change = (result["median_ms"] / before["median_ms"] - 1) * 100
+            mark = " ⚠️" if change > 10 else ""
+            print(
+                f"  {group}/{name:<42}{before['median_ms']:>10.3f} →"
+                f"{result['median_ms']:>10.3f} ms ({change:+.1f}%){mark}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--quick", action="store_true", help="統計の集計を10万件までにする")
+    parser.add_argument("--only", help="実行するグループ（extract,parse,statistics,render）")
+    parser.add_argument("--output", help="結果のJSON（省略時は results/<コミット>.json）")
+    parser.add_argument("--compare", help="比較する以前の結果のJSON")
+    args = parser.parse_args()
+
+    sizes = [size for size in STAT_SIZES if not args.quick or size <= 100_000]
+    groups = {
+        "extract": lambda: bench_extract(args.repeat),
+        "parse": lambda: bench_parse(args.repeat),
+        "statistics": lambda: bench_statistics(args.repeat, sizes),
+        "render": lambda: bench_render(args.repeat),
+    }
+    selected = args.only.split(",") if args.only else list(groups)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    for group in selected:
+        print(f"▶ {group}")
+        report["results"][group] = groups[group]()
+        for name, result in report["results"][group].items():
+            print(f"  {name:<48}{result['median_ms']:>10.3f} ms")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", "utf-8")
+    print(f"\n結果を保存しました: {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,77 @@ from firebase_admin import credentials, firestore
 from datetime import datetime
 import os
 import json
+import logging
+import random
+import atexit
+
+import metrics
+from read_cache import ReadCache
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# 統計の集計ドキュメント（書き込み競合を避けるため複数に分散）
+STATS_COLLECTION = "stats_aggregates"
+STATS_SHARDS = 10
+# 読み取りキャッシュ（統計・最近の結果）の元になるコレクション
+CACHED_COLLECTIONS = {"quiz_results", STATS_COLLECTION}
+AI_LEVELS = ["strong", "normal", "weak"]
 
 
 class FirebaseService:
-    def __init__(self):
-        """Firebase初期化"""
-        self.db = None
-        self._initialize_firebase()
+    def __init__(self, write_behind=True, db=None):
+        """Firebase初期化（db を渡すとそれを使う。負荷試験のインメモリ版など）"""
+        self.db = db
+        self.writer = None
+        # 統計・最近の結果の読み取りキャッシュ（このプロセスの書き込みで破棄）
+        self.read_cache = ReadCache(
+            ttl=int(os.environ.get("STATS_CACHE_TTL", 30)),
+            stale_ttl=int(os.environ.get("STATS_CACHE_STALE_TTL", 300)),
+        )
+        if self.db is None:
+            self._initialize_firebase()
+
+        # 結果の保存はキューに積み、バックグラウンドでまとめて書き込む
+        if self.db and write_behind:
+            self.writer = WriteBehindQueue(
+                self.db,
+                max_queue=int(os.environ.get("WRITE_BEHIND_MAX_QUEUE", 1000)),
+                batch_size=int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", 100)),
+                flush_interval=float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", 1.0)),
+                on_commit=self._after_commit,
+            )
+            atexit.register(self.close)
+
+    def close(self):
+        """未書き込みの結果を書き出す（ワーカー終了時に呼ぶ）"""
+        if self.writer is not None:
+            self.writer.close()
+
+    def _write(self, writes):
+        """書き込み（キューがあれば積むだけ、なければその場でバッチコミット）"""
+        if self.writer is not None:
+            self.writer.enqueue(writes)
+            return
+        batch = self.db.batch()
+        for doc_ref, data, merge in writes:
+            batch.set(doc_ref, data, merge=merge)
+        batch.commit()
+        self._after_commit(writes)
+
+    def _after_commit(self, writes):
+        """統計に関わる書き込みがあれば読み取りキャッシュを破棄
+
+        毎回答の question_results だけのバッチでは破棄しない。
+        """
+        if any(doc_ref.parent.id in CACHED_COLLECTIONS for doc_ref, _, _ in writes):
+            self.read_cache.invalidate()
+
+    def get_write_stats(self):
+        """書き込みキューの状態を取得"""
+        if self.writer is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.writer.get_stats()}
 
     def _initialize_firebase(self):
         """Firebase初期化処理"""
@@ -18,7 +82,7 @@ class FirebaseService:
             # 既に初期化されている場合はスキップ
             if firebase_admin._apps:
                 self.db = firestore.client()
-                print("Firebase: 既存の接続を使用")
+                logger.info("既存の接続を使用")
                 return
 
             # 環境変数からサービスアカウントキーを取得
@@ -47,26 +111,27 @@ class FirebaseService:
                         break
 
                 if not cred:
-                    print(
-                        "警告: Firebaseサービスアカウントが見つかりません。環境変数FIREBASE_SERVICE_ACCOUNTを設定するか、適切なJSONファイルを配置してください。"
+                    logger.warning(
+                        "Firebaseサービスアカウントが見つかりません。環境変数FIREBASE_SERVICE_ACCOUNTを設定するか、適切なJSONファイルを配置してください。"
                     )
                     return
 
             # Firebase初期化
             firebase_admin.initialize_app(cred)
             self.db = firestore.client()
-            print("Firebase: 初期化成功")
+            logger.info("初期化成功")
 
         except Exception as e:
-            print(f"Firebase初期化エラー: {e}")
+            logger.error("Firebase初期化エラー: %s", e)
             self.db = None
 
+    @metrics.timed("firestore.save_quiz_result")
     def save_quiz_result(
         self, player_score, ai_score, total_rounds, ai_level, game_duration=None
     ):
         """クイズ結果をFirestoreに保存"""
         if not self.db:
-            print("Firebase: データベース接続が利用できません")
+            logger.debug("データベース接続が利用できません")
             return None
 
         try:
@@ -85,21 +150,37 @@ class FirebaseService:
                 ),
             }
 
-            # Firestoreに保存
-            doc_ref = self.db.collection("quiz_results").add(result_data)
-            doc_id = doc_ref[1].id
+            # 結果の保存と集計の更新を同じバッチで反映
+            doc_ref = self.db.collection("quiz_results").document()
+            self._write(
+                [
+                    (doc_ref, result_data, False),
+                    (self._random_stats_shard(), self._stats_increments(result_data), True),
+                ]
+            )
+            doc_id = doc_ref.id
 
-            print(f"Firebase: クイズ結果を保存しました (ID: {doc_id})")
+            logger.info("クイズ結果を保存しました (ID: %s)", doc_id)
             return doc_id
 
         except Exception as e:
-            print(f"Firebase: 結果保存エラー - {e}")
+            logger.error("結果保存エラー - %s", e)
             return None
 
+    @metrics.timed("firestore.get_recent_results")
     def get_recent_results(self, limit=10):
-        """最近の結果を取得"""
+        """最近の結果を取得（短時間キャッシュ）"""
         if not self.db:
-            print("Firebase: データベース接続が利用できません")
+            logger.debug("データベース接続が利用できません")
+            return []
+        return self.read_cache.get(
+            ("recent_results", limit), lambda: self._load_recent_results(limit)
+        )
+
+    @metrics.timed("firestore.load_recent_results")
+    def _load_recent_results(self, limit):
+        if not self.db:
+            logger.debug("データベース接続が利用できません")
             return []
 
         try:
@@ -122,87 +203,160 @@ class FirebaseService:
             return results
 
         except Exception as e:
-            print(f"Firebase: 結果取得エラー - {e}")
+            logger.error("結果取得エラー - %s", e)
             return []
 
-    def get_statistics(self):
-        """統計情報を取得"""
-        if not self.db:
-            print("Firebase: データベース接続が利用できません")
-            return {
-                "total_games": 0,
-                "total_questions": 0,
-                "player_wins": 0,
-                "ai_wins": 0,
-                "draws": 0,
-                "average_player_score": 0,
-                "average_ai_score": 0,
-                "ai_level_distribution": {"strong": 0, "normal": 0, "weak": 0},
-                "win_rate": 0,
+    def _random_stats_shard(self):
+        shard = random.randrange(STATS_SHARDS)
+        return self.db.collection(STATS_COLLECTION).document(f"shard_{shard}")
+
+    def _stats_increments(self, result_data):
+        """1ゲーム分の結果を集計ドキュメントへの加算に変換"""
+        winner = result_data["winner"]
+        increments = {
+            "total_games": firestore.Increment(1),
+            "player_wins": firestore.Increment(1 if winner == "player" else 0),
+            "ai_wins": firestore.Increment(1 if winner == "ai" else 0),
+            "draws": firestore.Increment(1 if winner == "draw" else 0),
+            "total_player_score": firestore.Increment(result_data["player_score"] or 0),
+            "total_ai_score": firestore.Increment(result_data["ai_score"] or 0),
+        }
+        if result_data["ai_level"] in AI_LEVELS:
+            increments["ai_level_distribution"] = {
+                result_data["ai_level"]: firestore.Increment(1)
             }
+        return increments
+
+    @staticmethod
+    def _empty_totals():
+        return {
+            "total_games": 0,
+            "player_wins": 0,
+            "ai_wins": 0,
+            "draws": 0,
+            "total_player_score": 0,
+            "total_ai_score": 0,
+            "ai_level_distribution": {level: 0 for level in AI_LEVELS},
+        }
+
+    @staticmethod
+    def _build_statistics(totals):
+        """集計値から画面・API用の統計情報を作る"""
+        total_games = totals["total_games"]
+        return {
+            "total_games": total_games,
+            "player_wins": totals["player_wins"],
+            "ai_wins": totals["ai_wins"],
+            "draws": totals["draws"],
+            "average_player_score": (
+                round(totals["total_player_score"] / total_games, 2) if total_games > 0 else 0
+            ),
+            "average_ai_score": (
+                round(totals["total_ai_score"] / total_games, 2) if total_games > 0 else 0
+            ),
+            "ai_level_distribution": totals["ai_level_distribution"],
+            "win_rate": (
+                round(totals["player_wins"] / total_games * 100, 1) if total_games > 0 else 0
+            ),
+        }
+
+    @staticmethod
+    def _default_statistics():
+        return {
+            "total_games": 0,
+            "total_questions": 0,
+            "player_wins": 0,
+            "ai_wins": 0,
+            "draws": 0,
+            "average_player_score": 0,
+            "average_ai_score": 0,
+            "ai_level_distribution": {"strong": 0, "normal": 0, "weak": 0},
+            "win_rate": 0,
+        }
+
+    def _read_aggregate_totals(self):
+        """集計ドキュメントを合算。集計がまだない場合はNone"""
+        totals = self._empty_totals()
+        found = False
+        for doc in self.db.collection(STATS_COLLECTION).stream():
+            found = True
+            shard = doc.to_dict()
+            for key in totals:
+                if key == "ai_level_distribution":
+                    for level, count in shard.get(key, {}).items():
+                        if level in totals[key]:
+                            totals[key][level] += count
+                else:
+                    totals[key] += shard.get(key, 0)
+        return totals if found else None
+
+    def _scan_totals(self):
+        """quiz_resultsを全件読んで集計（バックフィル・集計がない場合用）"""
+        totals = self._empty_totals()
+        for doc in self.db.collection("quiz_results").stream():
+            result = doc.to_dict()
+            totals["total_games"] += 1
+
+            if result.get("winner") == "player":
+                totals["player_wins"] += 1
+            elif result.get("winner") == "ai":
+                totals["ai_wins"] += 1
+            else:
+                totals["draws"] += 1
 
-        try:
-            docs = self.db.collection("quiz_results").stream()
+            totals["total_player_score"] += result.get("player_score", 0)
+            totals["total_ai_score"] += result.get("ai_score", 0)
 
-            total_games = 0
-            player_wins = 0
-            ai_wins = 0
-            draws = 0
-            total_player_score = 0
-            total_ai_score = 0
-            ai_level_stats = {"strong": 0, "normal": 0, "weak": 0}
+            ai_level = result.get("ai_level", "normal")
+            if ai_level in totals["ai_level_distribution"]:
+                totals["ai_level_distribution"][ai_level] += 1
+        return totals
 
-            for doc in docs:
-                result = doc.to_dict()
-                total_games += 1
+    @metrics.timed("firestore.get_statistics")
+    def get_statistics(self):
+        """統計情報を取得（短時間キャッシュ）"""
+        if not self.db:
+            logger.debug("データベース接続が利用できません")
+            return self._default_statistics()
+        return self.read_cache.get("statistics", self._load_statistics)
 
-                if result.get("winner") == "player":
-                    player_wins += 1
-                elif result.get("winner") == "ai":
-                    ai_wins += 1
-                else:
-                    draws += 1
-
-                total_player_score += result.get("player_score", 0)
-                total_ai_score += result.get("ai_score", 0)
-
-                ai_level = result.get("ai_level", "normal")
-                if ai_level in ai_level_stats:
-                    ai_level_stats[ai_level] += 1
-
-            stats = {
-                "total_games": total_games,
-                "player_wins": player_wins,
-                "ai_wins": ai_wins,
-                "draws": draws,
-                "average_player_score": (
-                    round(total_player_score / total_games, 2) if total_games > 0 else 0
-                ),
-                "average_ai_score": (
-                    round(total_ai_score / total_games, 2) if total_games > 0 else 0
-                ),
-                "ai_level_distribution": ai_level_stats,
-                "win_rate": (
-                    round(player_wins / total_games * 100, 1) if total_games > 0 else 0
-                ),
-            }
+    @metrics.timed("firestore.load_statistics")
+    def _load_statistics(self):
+        """集計ドキュメントを読むだけなので件数によらず一定"""
 
-            return stats
+        try:
+            totals = self._read_aggregate_totals()
+            if totals is None:
+                logger.warning("集計ドキュメントがないため全件から集計します")
+                totals = self._scan_totals()
+            return self._build_statistics(totals)
 
         except Exception as e:
-            print(f"Firebase: 統計取得エラー - {e}")
-            return {
-                "total_games": 0,
-                "total_questions": 0,
-                "player_wins": 0,
-                "ai_wins": 0,
-                "draws": 0,
-                "average_player_score": 0,
-                "average_ai_score": 0,
-                "ai_level_distribution": {"strong": 0, "normal": 0, "weak": 0},
-                "win_rate": 0,
-            }
+            logger.error("統計取得エラー - %s", e)
+            return self._default_statistics()
+
+    @metrics.timed("firestore.rebuild_statistics")
+    def rebuild_statistics(self):
+        """quiz_resultsの全件から集計ドキュメントを作り直す（初回のバックフィル用）
+
+        実行中に保存された結果は反映されないことがあるため、アクセスの少ない時間に実行する。
+        """
+        if not self.db:
+            logger.debug("データベース接続が利用できません")
+            return None
 
+        totals = self._scan_totals()
+        batch = self.db.batch()
+        collection = self.db.collection(STATS_COLLECTION)
+        for shard in range(STATS_SHARDS):
+            # 合計はshard_0にまとめ、他のシャードは0にする
+            data = totals if shard == 0 else self._empty_totals()
+            batch.set(collection.document(f"shard_{shard}"), data)
+        batch.commit()
+        logger.info("集計を作り直しました（%d件）", totals["total_games"])
+        return self._build_statistics(totals)
+
+    @metrics.timed("firestore.save_individual_question_result")
     def save_individual_question_result(
         self,
         question_data,
@@ -215,7 +369,7 @@ class FirebaseService:
     ):
         """個別の問題結果を保存"""
         if not self.db:
-            print("Firebase: データベース接続が利用できません")
+            logger.debug("データベース接続が利用できません")
             return None
 
         try:
@@ -232,12 +386,13 @@ class FirebaseService:
                 "timestamp": datetime.now(),
             }
 
-            doc_ref = self.db.collection("question_results").add(question_result)
-            doc_id = doc_ref[1].id
+            doc_ref = self.db.collection("question_results").document()
+            self._write([(doc_ref, question_result, False)])
+            doc_id = doc_ref.id
 
-            print(f"Firebase: 問題結果を保存しました (ID: {doc_id})")
+            logger.debug("問題結果を保存しました (ID: %s)", doc_id)
             return doc_id
 
         except Exception as e:
-            print(f"Firebase: 問題結果保存エラー - {e}")
+            logger.error("問題結果保存エラー - %s", e)
             return None
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+
+class MemoryGameStore:
+    """プロセス内のゲーム状態ストア（ワーカー間では共有されない。開発用）"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._games = {}  # game_id -> (期限, 状態)
+        self._lock = threading.Lock()
+
+    def get(self, game_id):
+        with self._lock:
+            entry = self._games.get(game_id)
+            if not entry:
+                return None
+            if entry[0] < time.time():
+                del self._games[game_id]
+                return None
+            return json.loads(entry[1])
+
+    def put(self, game_id, state):
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            now = time.time()
+            self._games[game_id] = (now + self.ttl, data)
+            # 期限切れをたまに掃除
+            if len(self._games) % 100 == 0:
+                for key in [k for k, v in self._games.items() if v[0] < now]:
+                    del self._games[key]
+
+    def delete(self, game_id):
+        with self._lock:
+            self._games.pop(game_id, None)
+
+
+class SQLiteGameStore:
+    """SQLiteファイルに保存するゲーム状態ストア（同じマシンのワーカー間で共有）"""
+
+    def __init__(self, path="game_state.sqlite3", ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS game_state (
+                game_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS game_state_expires_at ON game_state (expires_at)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        """スレッドごとに接続を持つ（fork後は作り直す）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, game_id):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT state FROM game_state WHERE game_id = ? AND expires_at >= ?",
+                (game_id, time.time()),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def put(self, game_id, state):
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO game_state VALUES (?, ?, ?)",
+            (game_id, json.dumps(state, ensure_ascii=False), now + self.ttl),
+        )
+        conn.execute("DELETE FROM game_state WHERE expires_at < ?", (now,))
+        conn.commit()
+
+    def delete(self, game_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM game_state WHERE game_id = ?", (game_id,))
+        conn.commit()
+
+
+class FirestoreGameStore:
+    """Firestoreに保存するゲーム状態ストア（複数のdyno間で共有）
+
+    expires_at フィールドにFirestoreのTTLポリシーを設定すると自動で削除される。
+    """
+
+    def __init__(self, db, collection="game_states", ttl=3600):
+        self.db = db
+        self.collection = collection
+        self.ttl = ttl
+
+    def get(self, game_id):
+        doc = self.db.collection(self.collection).document(game_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        expires_at = data["expires_at"]
+        if isinstance(expires_at, (int, float)):
+            # 以前の形式（UNIX時刻）で保存されたゲーム
+            expires_at = datetime.fromtimestamp(expires_at, timezone.utc)
+        if expires_at < datetime.now(timezone.utc):
+            return None
+        return json.loads(data["state"])
+
+    def put(self, game_id, state):
+        self.db.collection(self.collection).document(game_id).set(
+            {
+                "state": json.dumps(state, ensure_ascii=False),
+                # TTLポリシーはTimestamp型のフィールドにしか効かないため datetime で保存する
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+            }
+        )
+
+    def delete(self, game_id):
+        self.db.collection(self.collection).document(game_id).delete()
+
+
+def new_game_id():
+    return uuid.uuid4().hex
+
+
+def create_game_store(kind="sqlite", ttl=3600, path="game_state.sqlite3", db=None):
+    """設定に応じたゲーム状態ストアを作る（memory / sqlite / firestore）"""
+    if kind == "memory":
+        return MemoryGameStore(ttl=ttl)
+    if kind == "sqlite":
+        return SQLiteGameStore(path=path, ttl=ttl)
+    if kind == "firestore":
+        if db is None:
+            raise ValueError("Firestoreのゲーム状態ストアにはデータベース接続が必要です")
+        return FirestoreGameStore(db, ttl=ttl)
+    raise ValueError(f"不明なゲーム状態ストアです: {kind}")
@@ -0,0 +1,47 @@
+# gunicornの設定（gunicornはカレントディレクトリのこのファイルを自動で読み込む）
+import os
+
+# 処理時間の大半はYahoo!・Gemini・Firestoreの待ちなので、1ワーカーで複数の
+# リクエストをスレッドで並行処理する（ワーカー数は WEB_CONCURRENCY で指定）
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+# Geminiの生成やSSEの配信は数十秒かかることがある
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# 問題を読んで回答するまでの間に接続が切られないよう、既定の2秒より長く保つ
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# マスターでアプリを読み込んでからforkする（ワーカーの起動が速く、メモリも共有される）
+# Gemini・Firebaseのクライアントは各ワーカーで最初のリクエスト時に作られる
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    """preload時は重いライブラリのimportだけ先に済ませておく"""
+    if not preload_app:
+        return
+    try:
+        import services
+
+        services.preload_modules()
+    except Exception as e:
+        server.log.exception("when_ready: 事前読み込みエラー - %s", e)
+
+
+def post_fork(server, worker):
+    """fork前に作られたクライアントやコネクションを捨てる"""
+    try:
+        import services
+
+        services.reset_after_fork()
+    except Exception as e:
+        server.log.exception("post_fork: 初期化エラー - %s", e)
+
+
+def worker_exit(server, worker):
+    """ワーカー終了時に、キューに残っている結果をFirestoreへ書き出す"""
+    try:
+        import services
+
+        services.close()
+    except Exception as e:
+        server.log.exception("worker_exit: 終了処理エラー - %s", e)
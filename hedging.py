@@ -0,0 +1,118 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """遅いリクエストに対して2本目を投げ、先に返った正しい結果を使う（ヘッジ）
+
+    1本目が直近レイテンシの percentile パーセンタイルを過ぎても返らなければ
+    2本目を投げる。追加の呼び出しは全体の budget 割合までに抑える
+    （1件ごとに budget 分のトークンがたまり、ヘッジ1回で1つ使う）。
+    """
+
+    def __init__(
+        self,
+        percentile=90,
+        budget=0.05,
+        burst=5,
+        min_samples=20,
+        min_delay=0.5,
+        max_workers=16,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self._tokens = burst
+
+        # 統計情報
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.skipped_by_budget = 0
+        self.last_delay = None
+
+    def _take_token(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.hedges_fired += 1
+                return True
+            self.skipped_by_budget += 1
+            return False
+
+    def run(self, attempt, router):
+        """attempt(avoid, on_start) を実行し、(結果, 使ったモデル名) を返す
+
+        attempt は (検証済みの結果またはNone, モデル名) を返す関数。
+        2本目はできれば1本目と別のモデルに送る。
+        """
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+        delay = router.latency_percentile(self.percentile, self.min_samples)
+        if delay is None:
+            # レイテンシのデータが少ないうちはヘッジしない
+            return attempt((), None)
+        delay = max(self.min_delay, delay)
+        self.last_delay = delay
+
+        primary_models = []
+        # 計測のラベル（route等）を引き継ぐため、コンテキストごと渡す
+        primary = self._executor.submit(
+            contextvars.copy_context().run, attempt, (), primary_models.append
+        )
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_token():
+            return primary.result()
+
+        logger.info("%.1f秒以内に応答がないため、2本目のリクエストを送信します", delay)
+        hedge = self._executor.submit(
+            contextvars.copy_context().run, attempt, tuple(primary_models), None
+        )
+        pending = {primary, hedge}
+        fallback = None
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, model_name = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if result:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedges_won += 1
+                    # 負けた方は止められないので、結果を捨てる
+                    return result, model_name
+                fallback = (result, model_name)
+        if fallback is not None:
+            return fallback
+        raise error
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "percentile": self.percentile,
+                "budget": self.budget,
+                "requests": self.requests,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "skipped_by_budget": self.skipped_by_budget,
+                "hedge_rate": (
+                    round(self.hedges_fired / self.requests, 3) if self.requests else 0
+                ),
+                "last_delay_ms": (
+                    round(self.last_delay * 1000) if self.last_delay is not None else None
+                ),
+            }
@@ -1,17 +1,344 @@
-import google.generativeai as genai
+import json
+import logging
 import random
-import requests
-from bs4 import BeautifulSoup
+import re
+import unicodedata
+from bs4 import BeautifulSoup, SoupStrainer
 import os
+from urllib.parse import urljoin
+
+from article_extractor import extract_article
+from http_cache import shared_cache
+import log_config
+import metrics
+from model_router import ModelRouter, ModelUnavailableError
+from prompt_builder import PromptBuilder, TokenCounter, TokenUsage
+from rate_limit import RateLimited, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TOPICS_URL = "https://news.yahoo.co.jp/topics/business"
+
+# トピック一覧は数分単位、記事本文はほぼ更新されないためTTLを分ける
+TOPICS_CACHE_TTL = 180
+ARTICLE_CACHE_TTL = 3600
+# 出題済みのニュースと重複した場合に選び直す回数
+MAX_ARTICLE_ATTEMPTS = 3
+
+# 使うGeminiモデル（先頭ほど優先。呼び出しごとに健全なものを選ぶ）
+DEFAULT_MODEL_NAMES = [
+    "gemini-2.0-flash",
+    "gemini-1.5-flash",
+    "gemini-flash-latest",
+    "gemini-pro",
+]
+
+# プロンプトを変更したらバージョンを上げる（生成キャッシュのキーに含まれる）
+PROMPT_VERSION = "v1"
+QUIZ_PROMPT = """
+以下の文章から時事ネタの4択クイズを作成してください。
+以下のフォーマットで出力してください：
+
+Question: （ここに問題文）
+A: （選択肢A）
+B: （選択肢B）
+C: （選択肢C）
+D: （選択肢D）
+Answer: （正解の選択肢A、B、C、Dのいずれか）
+Explanation: （ここに解説）
+
+文章:
+{text}
+"""
+
+BATCH_FORMAT = """
+各クイズの前に「=== 番号 ===」の行を入れ、以下のフォーマットで出力してください：
+
+=== 1 ===
+Question: （ここに問題文）
+A: （選択肢A）
+B: （選択肢B）
+C: （選択肢C）
+D: （選択肢D）
+Answer: （正解の選択肢A、B、C、Dのいずれか）
+Explanation: （ここに解説）
+"""
+
+# 1つの記事からN問
+QUIZ_BATCH_PROMPT = (
+    """
+以下の文章から、内容の重ならない時事ネタの4択クイズを{count}問作成してください。
+"""
+    + BATCH_FORMAT
+    + """
+文章:
+{text}
+"""
+)
+
+# N個の記事から1問ずつ（番号は記事の番号と一致させる）
+QUIZ_MULTI_ARTICLE_PROMPT = (
+    """
+以下の{count}個の記事それぞれから、時事ネタの4択クイズを1問ずつ作成してください。
+「=== 番号 ===」の番号は元にした記事の番号にしてください。
+"""
+    + BATCH_FORMAT
+    + """
+{articles}
+"""
+)
+
+# --------------------------
+# JSONモード（response_schemaで出力形式を固定する）
+# --------------------------
+QUIZ_JSON_PROMPT = """
+以下の文章から時事ネタの4択クイズを作成してください。
+answerには正解の選択肢（A、B、C、Dのいずれか）を入れてください。
+
+文章:
+{text}
+"""
+
+QUIZ_JSON_BATCH_PROMPT = """
+以下の文章から、内容の重ならない時事ネタの4択クイズを{count}問作成してください。
+numberには1から順に番号を、answerには正解の選択肢（A、B、C、Dのいずれか）を入れてください。
+
+文章:
+{text}
+"""
+
+QUIZ_JSON_MULTI_ARTICLE_PROMPT = """
+以下の{count}個の記事それぞれから、時事ネタの4択クイズを1問ずつ作成してください。
+numberには元にした記事の番号を、answerには正解の選択肢（A、B、C、Dのいずれか）を入れてください。
+
+{articles}
+"""
+
+_QUIZ_PROPERTIES = {
+    "question": {"type": "string"},
+    "choice_a": {"type": "string"},
+    "choice_b": {"type": "string"},
+    "choice_c": {"type": "string"},
+    "choice_d": {"type": "string"},
+    "answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+    "explanation": {"type": "string"},
+}
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": _QUIZ_PROPERTIES,
+    "required": list(_QUIZ_PROPERTIES),
+}
+QUIZ_LIST_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"number": {"type": "integer"}, **_QUIZ_PROPERTIES},
+        "required": ["number", *_QUIZ_PROPERTIES],
+    },
+}
+
+REQUIRED_FIELDS = [
+    "question",
+    "choice_a",
+    "choice_b",
+    "choice_c",
+    "choice_d",
+    "answer",
+    "explanation",
+]
+_FIELD_PREFIXES = [
+    ("Question:", "question"),
+    ("A:", "choice_a"),
+    ("B:", "choice_b"),
+    ("C:", "choice_c"),
+    ("D:", "choice_d"),
+    ("Answer:", "answer"),
+    ("Explanation:", "explanation"),
+]
+_BATCH_SEPARATOR = re.compile(r"^\s*=+\s*(\d+)\s*=+\s*$", re.M)
+
+
+# 解答前にブラウザへ送ってよい項目（正解・解説は含めない）
+QUESTION_FIELDS = ["question", "choice_a", "choice_b", "choice_c", "choice_d"]
+# 正解の欄に許す形（前後の括弧・記号は可）
+_ANSWER_PATTERN = re.compile(r"^\W*([A-D])\W*$")
+
+
+def parse_partial_quiz_text(text):
+    """受信途中のテキストから、行が確定している項目だけを取り出す"""
+    quiz_data = {}
+    # 最後の行はまだ途中の可能性があるので使わない
+    for line in text.split("\n")[:-1]:
+        line = line.strip()
+        for prefix, key in _FIELD_PREFIXES:
+            if line.startswith(prefix):
+                quiz_data[key] = line.replace(prefix, "").strip()
+                break
+    return quiz_data
+
+
+def parse_quiz_text(text):
+    """Question:/A:/…/Explanation: 形式のテキストを辞書にする。不完全ならNone"""
+    quiz_data = parse_partial_quiz_text(text + "\n")
+
+    if not all(key in quiz_data for key in REQUIRED_FIELDS):
+        return None
+    quiz_data["answer"] = normalize_answer(quiz_data["answer"])
+    return quiz_data if quiz_data["answer"] else None
+
+
+def normalize_answer(value):
+    """「（B）」「Ｂ」などの揺れを A〜D の1文字にそろえる
+
+    記号を除くと A〜D の1文字だけの場合に限る（"Answer B" などはNone）。
+    """
+    answer = _ANSWER_PATTERN.match(unicodedata.normalize("NFKC", str(value)).upper())
+    return answer.group(1) if answer else None
+
+
+def validate_quiz(data):
+    """JSONから読み込んだクイズを検証し、必要な項目だけの辞書にする。不正ならNone"""
+    if not isinstance(data, dict):
+        return None
+    quiz_data = {}
+    for key in REQUIRED_FIELDS:
+        value = data.get(key)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        quiz_data[key] = value.strip()
+    quiz_data["answer"] = normalize_answer(quiz_data["answer"])
+    return quiz_data if quiz_data["answer"] else None
+
+
+def _load_json(text):
+    """JSONを読み込む（```json で囲まれていても可）。失敗したらNone"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def parse_quiz_json(text):
+    """QUIZ_SCHEMA形式のJSONを検証済みのクイズにする。不正ならNone"""
+    data = _load_json(text)
+    if isinstance(data, list) and data:
+        data = data[0]
+    return validate_quiz(data)
+
+
+def parse_quiz_batch_json(text):
+    """QUIZ_LIST_SCHEMA形式のJSONを {番号: クイズ} にする（不正な要素は捨てる）"""
+    data = _load_json(text)
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        return {}
+
+    quizzes = {}
+    for position, item in enumerate(data, start=1):
+        quiz_data = validate_quiz(item)
+        if not quiz_data:
+            continue
+        number = item.get("number")
+        number = number if isinstance(number, int) else position
+        quizzes.setdefault(number, quiz_data)
+    return quizzes
+
+
+def parse_quiz_batch(text):
+    """「=== 番号 ===」区切りの複数クイズを {番号: クイズ} にする
+
+    壊れたブロックは捨て、正しいものだけを返す。区切りがない場合は
+    「Question:」の行で分割し、出現順に1から番号を振る。
+    """
+    parts = _BATCH_SEPARATOR.split(text)
+    if len(parts) > 1:
+        # [前置き, 番号, 本文, 番号, 本文, ...]
+        blocks = [(int(parts[i]), parts[i + 1]) for i in range(1, len(parts) - 1, 2)]
+    else:
+        chunks = re.split(r"^(?=\s*Question:)", text, flags=re.M)
+        chunks = [chunk for chunk in chunks if "Question:" in chunk]
+        blocks = list(enumerate(chunks, start=1))
+
+    quizzes = {}
+    for number, block in blocks:
+        quiz_data = parse_quiz_text(block)
+        if quiz_data and number not in quizzes:
+            quizzes[number] = quiz_data
+    return quizzes
+
+
+# 出力モードごとの (プロンプト, パーサー, generation_config)
+PROMPTS = {
+    "text": {
+        "single": (QUIZ_PROMPT, parse_quiz_text, None),
+        "batch": (QUIZ_BATCH_PROMPT, parse_quiz_batch, None),
+        "multi": (QUIZ_MULTI_ARTICLE_PROMPT, parse_quiz_batch, None),
+    },
+    "json": {
+        "single": (
+            QUIZ_JSON_PROMPT,
+            parse_quiz_json,
+            {"response_mime_type": "application/json", "response_schema": QUIZ_SCHEMA},
+        ),
+        "batch": (
+            QUIZ_JSON_BATCH_PROMPT,
+            parse_quiz_batch_json,
+            {"response_mime_type": "application/json", "response_schema": QUIZ_LIST_SCHEMA},
+        ),
+        "multi": (
+            QUIZ_JSON_MULTI_ARTICLE_PROMPT,
+            parse_quiz_batch_json,
+            {"response_mime_type": "application/json", "response_schema": QUIZ_LIST_SCHEMA},
+        ),
+    },
+}
 
 
 class QuizGenerator:
-    def __init__(self, api_key):
+    def __init__(
+        self,
+        api_key,
+        article_sources=None,
+        quiz_cache=None,
+        output_mode="text",
+        model_names=None,
+        hedger=None,
+        models=None,
+        topics_url=TOPICS_URL,
+        article_index=None,
+        prompt_token_budget=None,
+        rate_limiter=None,
+    ):
         self.api_key = api_key
+        if output_mode not in PROMPTS:
+            raise ValueError(f"不明な出力モードです: {output_mode}")
+        # "text": Question:/A:/… の行形式、"json": response_schemaで形式を固定
+        self.output_mode = output_mode
+        # 生成に成功したが使えなかった（検証NG）回数
+        self.generation_calls = 0
+        self.wasted_generations = 0
+        # クローラーがカテゴリごとに収集した記事があれば優先して使う
+        self.article_sources = article_sources
+        # 最近出題したニュースと同じ記事（別の配信元を含む）を避けるための索引
+        self.article_index = article_index
+        # 同じ記事の再生成を避けるためのキャッシュ
+        self.quiz_cache = quiz_cache
+        # 遅い応答に2本目を投げる（Noneなら無効）
+        self.hedger = hedger
+        # 記事一覧のURL（負荷試験ではスタブサーバーを指す）
+        self.topics_url = topics_url
+        # Gemini呼び出しの回数制限（TokenBucket。Noneなら制限しない）
+        self.rate_limiter = rate_limiter
+        # 同じ記事の生成が同時に走ったら1回の呼び出しを共有する
+        self._flight = SingleFlight()
 
         # APIキーの検証
         if not api_key or api_key == "dummy_key":
-            print("警告: GEMINI_API_KEYが設定されていません")
+            logger.warning("GEMINI_API_KEYが設定されていません")
             raise ValueError(
                 "GEMINI_API_KEY環境変数が設定されていません。HerokuのConfig Varsで設定してください。"
             )
@@ -19,6 +346,7 @@ class QuizGenerator:
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
+        self.http = shared_cache
         self.ai_levels = {
             "strong": {
                 "correct_rate": 0.95,
@@ -34,31 +362,41 @@ class QuizGenerator:
             },
         }
 
-        print(f"APIキーの最初の10文字: {api_key[:10]}...")
-        genai.configure(api_key=self.api_key)
+        if models is None:
+            models = self._create_models(model_names or DEFAULT_MODEL_NAMES)
 
-        # 利用可能なモデルを順に試す
-        model_names = [
-            "gemini-2.0-flash",
-            "gemini-1.5-flash",
-            "gemini-flash-latest",
-            "gemini-pro",
-        ]
+        if not models:
+            raise Exception(
+                "利用可能なGeminiモデルが見つかりませんでした。APIキーが正しいか確認してください。"
+            )
+        self.router = ModelRouter(models)
+        # キャッシュキーには優先モデルの名前を使う（フォールバック先の結果も共有する）
+        self.model_name = models[0][0]
+        # 記事本文を情報量の多い文に絞ってから送る（Noneなら本文をそのまま送る）
+        self.prompt_builder = (
+            PromptBuilder(TokenCounter(models[0][1]), budget=prompt_token_budget)
+            if prompt_token_budget
+            else None
+        )
+        # 呼び出しごとの入力・出力トークン数
+        self.token_usage = TokenUsage()
+
+    def _create_models(self, model_names):
+        """利用可能なモデルをすべて用意する（呼び出しごとに健全なものを選ぶ）"""
+        # importに時間がかかるため、使うときに読み込む
+        import google.generativeai as genai
 
-        self.model = None
+        genai.configure(api_key=self.api_key)
+
+        models = []
         for model_name in model_names:
             try:
-                self.model = genai.GenerativeModel(model_name)
-                print(f"成功: モデル '{model_name}' を使用します")
-                break
+                models.append((model_name, genai.GenerativeModel(model_name)))
+                logger.info("モデル '%s' を使用します", model_name)
             except Exception as e:
-                print(f"モデル '{model_name}' の初期化に失敗: {e}")
+                logger.warning("モデル '%s' の初期化に失敗: %s", model_name, e)
                 continue
-
-        if self.model is None:
-            raise Exception(
-                "利用可能なGeminiモデルが見つかりませんでした。APIキーが正しいか確認してください。"
-            )
+        return models
 
     # --------------------------
     # AI動作シミュレーション関連
@@ -91,7 +429,12 @@ class QuizGenerator:
     # --------------------------
     # 記事取得
     # --------------------------
-    def get_news_article(self):
+    @metrics.timed("get_news_article")
+    def get_news_article(self, category=None):
+        """出題する記事を1件選ぶ（category を指定するとそのカテゴリから）
+
+        収集済みの記事がなければ一覧ページから取得し、それも失敗したらサンプル記事を使う。
+        """
         sample_articles = [
             {
                 "content": "日本銀行は本日、政策金利を0.1%引き上げることを発表しました。これは2年ぶりの利上げとなり、インフレ対策の一環として実施されます。",
@@ -110,123 +453,362 @@ class QuizGenerator:
             },
         ]
 
-        try:
-            url = "https://news.yahoo.co.jp/topics/business"
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            news_feed = soup.find("ul", class_="newsFeed_list")
-            article_links = news_feed.find_all("a") if news_feed else []
+        if self.article_sources is not None:
+            for _ in range(MAX_ARTICLE_ATTEMPTS):
+                with metrics.span("article_store"):
+                    article = self.article_sources.take(category)
+                if not article:
+                    break
+                if self._claim_article(article):
+                    return article
 
-            if article_links:
-                random_article = random.choice(article_links)
-                article_url = random_article.get("href")
-                article_response = requests.get(article_url, headers=self.headers, timeout=10)
-                article_soup = BeautifulSoup(article_response.text, "html.parser")
-
-                content = article_soup.get_text()[:2000]
-                title = article_soup.find("h1").text if article_soup.find("h1") else "タイトルなし"
+        # トピック一覧のURLの末尾をカテゴリ名に置き換える
+        topics_url = self.topics_url if category is None else urljoin(self.topics_url, category)
+        try:
+            with metrics.span("topics_fetch"):
+                html = self.http.get(topics_url, ttl=TOPICS_CACHE_TTL)
+            with metrics.span("topics_parse"):
+                soup = BeautifulSoup(
+                    html, "html.parser", parse_only=SoupStrainer("ul", class_="newsFeed_list")
+                )
+                news_feed = soup.find("ul")
+                article_links = news_feed.find_all("a") if news_feed else []
 
-                return {"content": content, "url": article_url, "title": title}
+            random.shuffle(article_links)
+            article = None
+            for link in article_links[:MAX_ARTICLE_ATTEMPTS]:
+                article_url = link.get("href")
+                with metrics.span("article_fetch"):
+                    article_html = self.http.get(article_url, ttl=ARTICLE_CACHE_TTL)
+                with metrics.span("article_extract"):
+                    article = extract_article(article_html, article_url)
+                if category is not None:
+                    article["category"] = category
+                if self._claim_article(article):
+                    return article
+            if article:
+                # どれも出題済みなら、サンプル記事よりは実際のニュースを使う
+                return article
 
-            print("Yahoo!ニュースからの記事取得に失敗、サンプル記事を使用します")
+            logger.warning("Yahoo!ニュースからの記事取得に失敗、サンプル記事を使用します")
             return random.choice(sample_articles)
 
+        except RateLimited:
+            raise
         except Exception as e:
-            print(f"記事取得エラー: {e} - サンプル記事を使用します")
+            logger.warning("記事取得エラー: %s - サンプル記事を使用します", e)
             return random.choice(sample_articles)
 
+    def _claim_article(self, article):
+        """最近出題したニュースと重複していなければ出題済みとして記録し、Trueを返す"""
+        if self.article_index is None:
+            return True
+        with metrics.span("article_index"):
+            return self.article_index.claim(article)
+
     # --------------------------
     # クイズ生成
     # --------------------------
+    def _request(self, kind, on_text=None, hedge=False, **params):
+        """出力モードに応じたプロンプトで呼び出し、検証済みの結果を返す
+
+        on_text を渡すとストリーミングで受信し、チャンクごとに
+        それまでに受信したテキストを渡して呼び出す。
+        hedge=True でヘッジが有効なら、応答が遅いときに2本目を投げる。
+        """
+        prompt, parser, generation_config = PROMPTS[self.output_mode][kind]
+
+        def call(model):
+            response = model.generate_content(
+                prompt.format(**params),
+                generation_config=generation_config,
+                stream=on_text is not None,
+            )
+            raw = ""
+            try:
+                if on_text is not None:
+                    for chunk in response:
+                        raw += chunk.text
+                        on_text(raw)
+                else:
+                    raw = response.text
+            except Exception:
+                # ブロックされた場合などtextを持たない
+                pass
+            return response, raw, getattr(response, "usage_metadata", None)
+
+        def attempt(avoid=(), on_start=None):
+            if self.rate_limiter is not None:
+                with metrics.span("rate_limit_wait"):
+                    self.rate_limiter.acquire()
+            with metrics.span("gemini") as gemini_span:
+                (response, raw, usage), model_name = self.router.call(
+                    call, avoid=avoid, on_start=on_start
+                )
+                gemini_span.labels["model"] = model_name
+            if usage is not None:
+                self._record_usage(model_name, kind, usage)
+            with metrics.span("parse", model=model_name):
+                result = parser(raw) if raw else None
+
+            self.generation_calls += 1
+            if not result:
+                self.wasted_generations += 1
+                logger.warning(
+                    "レスポンスの検証に失敗しました (%s)",
+                    model_name,
+                    extra={"model": model_name, "kind": kind, "response_chars": len(raw)},
+                )
+                # 生のレスポンスは大きく正解も含むので、DEBUGのときに一部だけ残す
+                if logger.isEnabledFor(logging.DEBUG) and log_config.sampled():
+                    logger.debug("生のレスポンス: %s", raw or response)
+            return result, model_name
+
+        if hedge and self.hedger is not None and on_text is None:
+            result, _ = self.hedger.run(attempt, self.router)
+        else:
+            result, _ = attempt()
+        return result
+
+    def _record_usage(self, model_name, kind, usage):
+        input_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+        self.token_usage.record(model_name, input_tokens, output_tokens)
+        logger.debug(
+            "トークン数: 入力%d 出力%d",
+            input_tokens,
+            output_tokens,
+            extra={"model": model_name, "kind": kind},
+        )
+
+    def _prompt_text(self, text, count=1):
+        """プロンプトに入れる記事本文（トークン数の予算内に絞る。count 問作るなら count 倍）"""
+        if self.prompt_builder is None:
+            return text
+        with metrics.span("prompt_build"):
+            return self.prompt_builder.build(text, budget=self.prompt_builder.budget * count)
+
+    def get_model_stats(self):
+        """モデルごとのレイテンシ・エラー率・サーキットの状態を取得"""
+        return self.router.get_stats()
+
+    def get_generation_stats(self):
+        """生成の無駄（検証NGで捨てた回数）の割合・ヘッジ・回数制限の状況・トークン数を取得"""
+        return {
+            "output_mode": self.output_mode,
+            "calls": self.generation_calls,
+            "wasted": self.wasted_generations,
+            "wasted_rate": (
+                round(self.wasted_generations / self.generation_calls * 100, 1)
+                if self.generation_calls > 0
+                else 0
+            ),
+            "hedging": self.hedger.get_stats() if self.hedger is not None else None,
+            "coalesced": self._flight.get_stats(),
+            "rate_limit": self.rate_limiter.get_stats() if self.rate_limiter is not None else None,
+            "tokens": self.token_usage.get_stats(),
+            "prompt": (
+                {
+                    "token_budget": self.prompt_builder.budget,
+                    "token_counter": self.prompt_builder.counter.get_stats(),
+                }
+                if self.prompt_builder is not None
+                else None
+            ),
+        }
+
+    @metrics.timed("generate_quiz")
     def generate_quiz(self, text):
-        """AIによる4択クイズ生成"""  # ←★ここ、インデント修正＋docstring正位置
+        """AIによる4択クイズ生成"""
+        cache_key = None
+        if self.quiz_cache is not None:
+            cache_key = self._cache_key(text)
+            with metrics.span("quiz_cache_get"):
+                cached = self.quiz_cache.get(cache_key)
+            if cached:
+                logger.debug("キャッシュ済みのクイズを使用します")
+                return cached
+
+        def generate():
+            quiz_data = self._request("single", hedge=True, text=self._prompt_text(text))
+            if quiz_data and cache_key is not None:
+                with metrics.span("quiz_cache_put"):
+                    self.quiz_cache.put(cache_key, quiz_data)
+            return quiz_data
+
         try:
-            print("🧠 Gemini APIにリクエスト送信中...")
-            prompt = f"""
-以下の文章から時事ネタの4択クイズを作成してください。
-以下のフォーマットで出力してください：
+            quiz_data = self._flight.do(("single", text), generate)
+            # 同時に待っていた呼び出し元と共有しているため、コピーを返す
+            return dict(quiz_data) if quiz_data else None
+        except (RateLimited, ModelUnavailableError):
+            # 呼び出し元で503（Retry-After付き）にする
+            raise
+        except Exception as e:
+            logger.exception("クイズ生成エラー: %s", e)
+            return None
 
-Question: （ここに問題文）
-A: （選択肢A）
-B: （選択肢B）
-C: （選択肢C）
-D: （選択肢D）
-Answer: （正解の選択肢A、B、C、Dのいずれか）
-Explanation: （ここに解説）
+    @metrics.timed("generate_quiz_streaming")
+    def generate_quiz_streaming(self, text, on_question):
+        """ストリーミングで生成し、問題文と選択肢がそろった時点で on_question を呼ぶ
 
-文章:
-{text}
-"""
-            response = self.model.generate_content(prompt)
-
-            print("🧩 Geminiのレスポンス受信完了")
-            print("📩 生のレスポンス:")
-            print(response.text if hasattr(response, "text") else response)
-
-            if not hasattr(response, "text") or not response.text:
-                print("❌ レスポンスにtextが含まれていません")
-                return None
-
-            lines = response.text.split("\n")
-            quiz_data = {}
-
-            for line in lines:
-                line = line.strip()
-                if line.startswith("Question:"):
-                    quiz_data["question"] = line.replace("Question:", "").strip()
-                elif line.startswith("A:"):
-                    quiz_data["choice_a"] = line.replace("A:", "").strip()
-                elif line.startswith("B:"):
-                    quiz_data["choice_b"] = line.replace("B:", "").strip()
-                elif line.startswith("C:"):
-                    quiz_data["choice_c"] = line.replace("C:", "").strip()
-                elif line.startswith("D:"):
-                    quiz_data["choice_d"] = line.replace("D:", "").strip()
-                elif line.startswith("Answer:"):
-                    quiz_data["answer"] = line.replace("Answer:", "").strip()
-                elif line.startswith("Explanation:"):
-                    quiz_data["explanation"] = line.replace("Explanation:", "").strip()
-
-            required_fields = [
-                "question",
-                "choice_a",
-                "choice_b",
-                "choice_c",
-                "choice_d",
-                "answer",
-                "explanation",
-            ]
-            if all(key in quiz_data for key in required_fields):
-                print("✅ クイズ生成成功！")
-                return quiz_data
-            else:
-                print("⚠️ クイズデータ不完全:", quiz_data)
-                return None
+        テキストモードでは解説の受信を待たずに問題を渡せる。
+        戻り値は generate_quiz と同じ（正解・解説を含む完全なクイズ）。
+        """
+        notified = False
+
+        def notify(quiz_data):
+            nonlocal notified
+            if not notified:
+                notified = True
+                on_question({key: quiz_data[key] for key in QUESTION_FIELDS})
 
+        def on_text(raw):
+            if self.output_mode == "text" and not notified:
+                partial = parse_partial_quiz_text(raw)
+                if all(key in partial for key in QUESTION_FIELDS):
+                    notify(partial)
+
+        cache_key = None
+        if self.quiz_cache is not None:
+            cache_key = self._cache_key(text)
+            cached = self.quiz_cache.get(cache_key)
+            if cached:
+                notify(cached)
+                return cached
+
+        def generate():
+            quiz_data = self._request("single", on_text=on_text, text=self._prompt_text(text))
+            if quiz_data and cache_key is not None:
+                self.quiz_cache.put(cache_key, quiz_data)
+            return quiz_data
+
+        try:
+            # 同じ記事を生成中なら、その完了を待って結果を使う
+            quiz_data = self._flight.do(("single", text), generate)
+            if quiz_data:
+                quiz_data = dict(quiz_data)
+                notify(quiz_data)
+            return quiz_data
+        except (RateLimited, ModelUnavailableError):
+            raise
         except Exception as e:
-            import traceback
-            print("=== クイズ生成エラー詳細 ===")
-            traceback.print_exc()
-            print("=============================")
+            logger.error("クイズ生成エラー: %s", e)
             return None
 
+    def _cache_key(self, text):
+        return self.quiz_cache.make_key(
+            text, f"{PROMPT_VERSION}-{self.output_mode}", self.model_name
+        )
+
+    def generate_quizzes(self, text, count):
+        """1つの記事から count 問を1回のAPI呼び出しで生成（正しいものだけ返す）"""
+        try:
+            parsed = self._request("batch", count=count, text=self._prompt_text(text, count)) or {}
+            quizzes = list(parsed.values())[:count]
+            logger.info("%d問中%d問の生成に成功", count, len(quizzes))
+            return quizzes
+        except (RateLimited, ModelUnavailableError):
+            raise
+        except Exception as e:
+            logger.error("一括クイズ生成エラー: %s", e)
+            return []
+
+    def generate_quizzes_from_articles(self, articles):
+        """複数の記事から1問ずつ、1回のAPI呼び出しで生成
+
+        戻り値は articles と同じ長さのリストで、生成に失敗した位置はNone。
+        キャッシュ済みの記事はAPIに送らない。
+        """
+        results = [None] * len(articles)
+        pending = []
+        for i, article in enumerate(articles):
+            if self.quiz_cache is not None:
+                results[i] = self.quiz_cache.get(self._cache_key(article["content"]))
+            if results[i] is None:
+                pending.append(i)
+
+        if not pending:
+            return results
+
+        try:
+            sections = "\n\n".join(
+                f"[記事{number}]\n{self._prompt_text(articles[i]['content'])}"
+                for number, i in enumerate(pending, start=1)
+            )
+            parsed = self._request("multi", count=len(pending), articles=sections) or {}
+            for number, i in enumerate(pending, start=1):
+                quiz_data = parsed.get(number)
+                if quiz_data:
+                    results[i] = quiz_data
+                    if self.quiz_cache is not None:
+                        self.quiz_cache.put(self._cache_key(articles[i]["content"]), quiz_data)
+            logger.info("%d記事中%d問の生成に成功", len(pending), len(parsed))
+        except (RateLimited, ModelUnavailableError):
+            # 呼び出し元（事前生成プール）で Retry-After だけ待たせる
+            raise
+        except Exception as e:
+            logger.error("一括クイズ生成エラー: %s", e)
+        return results
+
     # --------------------------
     # 記事取得＋クイズ生成
     # --------------------------
-    def create_quiz(self):
+    @metrics.timed("create_quiz")
+    def create_quiz(self, category=None):
         """記事取得からクイズ生成までの一連の処理"""
         try:
-            article_data = self.get_news_article()
+            article_data = self.get_news_article(category)
             if article_data:
                 quiz_data = self.generate_quiz(article_data["content"])
                 if quiz_data:
-                    quiz_data["article_content"] = article_data["content"]
-                    quiz_data["article_url"] = article_data["url"]
-                    quiz_data["article_title"] = article_data["title"]
-                    return quiz_data
+                    return self._attach_article(quiz_data, article_data)
             return None
+        except (RateLimited, ModelUnavailableError):
+            raise
         except Exception as e:
-            print(f"クイズ作成エラー: {e}")
+            logger.error("クイズ作成エラー: %s", e)
             return None
+
+    def _attach_article(self, quiz_data, article_data):
+        quiz_data["article_content"] = article_data["content"]
+        quiz_data["article_url"] = article_data["url"]
+        quiz_data["article_title"] = article_data["title"]
+        quiz_data["category"] = article_data.get("category")
+        return quiz_data
+
+    def create_quizzes(self, count):
+        """count 個の記事を集め、1回のAPI呼び出しでまとめてクイズ化
+
+        別々の記事が count 個集まらなかったときは、足りない分を
+        最初の記事から複数問まとめて作る（generate_quizzes）。
+        """
+        try:
+            articles = {}
+            for _ in range(count * 2):
+                article_data = self.get_news_article()
+                if article_data:
+                    articles.setdefault(article_data["url"], article_data)
+                if len(articles) >= count:
+                    break
+
+            articles = list(articles.values())
+            if not articles:
+                return []
+            quizzes = []
+            for article_data, quiz_data in zip(
+                articles, self.generate_quizzes_from_articles(articles)
+            ):
+                if quiz_data:
+                    quizzes.append(self._attach_article(quiz_data, article_data))
+            if len(articles) < count:
+                article_data = articles[0]
+                for quiz_data in self.generate_quizzes(
+                    article_data["content"], count - len(articles)
+                ):
+                    quizzes.append(self._attach_article(quiz_data, article_data))
+            return quizzes
+        except (RateLimited, ModelUnavailableError):
+            raise
+        except Exception as e:
+            logger.error("クイズ作成エラー: %s", e)
+            return []
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limit import RateLimited, SingleFlight
+
+
+class HttpCache:
+    """コネクションを使い回し、ETag/Last-Modifiedで再検証するHTTPキャッシュ
+
+    同じURLの取得が同時に走った場合は1回だけ取得して結果を共有する。
+    limiter（TokenBucket）を設定すると、取得の前にトークンを取る。
+    上限に達したときは期限切れのキャッシュがあればそれを返す。
+    """
+
+    def __init__(
+        self,
+        headers=None,
+        max_entries=256,
+        max_bytes=20 * 1024 * 1024,
+        default_ttl=300,
+        pool_size=10,
+    ):
+        self.headers = headers or {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.pool_size = pool_size
+
+        self._session = None
+        self._entries = OrderedDict()  # url -> dict(text, etag, last_modified, fetched_at, ttl)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        # 外向きのリクエストの回数制限（Noneなら制限しない）
+        self.limiter = None
+
+        # 統計情報
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stale = 0
+
+    @property
+    def session(self):
+        """共有セッション（初回アクセス時に作成）"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    def reset(self):
+        """セッションを破棄（fork後などに使用）"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def _store(self, url, entry):
+        """ロック取得中に呼び出すこと"""
+        old = self._entries.pop(url, None)
+        if old:
+            self._bytes -= len(old["text"])
+        self._entries[url] = entry
+        self._bytes += len(entry["text"])
+
+        # サイズ上限を超えたら古いものから削除
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted["text"])
+
+    def get(self, url, ttl=None, timeout=10, max_wait=None, background=False):
+        """URLの本文を取得。TTL内ならキャッシュ、期限切れなら条件付きリクエスト
+
+        max_wait は回数制限で待てる秒数（Noneなら limiter の既定）。
+        background=True（クローラー）は回数制限のトークンを利用者のリクエストより後回しにする。
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry:
+                self._entries.move_to_end(url)
+                if now - entry["fetched_at"] < entry["ttl"]:
+                    self.hits += 1
+                    return entry["text"]
+
+        # 利用者のリクエストが後回しの取得の完了を待たないよう、別々にまとめる
+        key = (url, "background") if background else url
+        return self._flight.do(
+            key, lambda: self._fetch(url, entry, ttl, timeout, max_wait, background)
+        )
+
+    def _fetch(self, url, entry, ttl, timeout, max_wait, background=False):
+        if self.limiter is not None:
+            try:
+                self.limiter.acquire(max_wait, background=background)
+            except RateLimited:
+                if entry is None:
+                    raise
+                # 少し古くても、断るよりはキャッシュを返す
+                with self._lock:
+                    self.stale += 1
+                return entry["text"]
+
+        headers = {}
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and entry:
+            with self._lock:
+                entry["fetched_at"] = time.time()
+                entry["ttl"] = ttl
+                self.revalidated += 1
+            return entry["text"]
+
+        response.raise_for_status()
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            # charset指定がない場合、requestsはISO-8859-1とみなすため推定させる
+            response.encoding = response.apparent_encoding
+        text = response.text
+        with self._lock:
+            self.misses += 1
+            self._store(
+                url,
+                {
+                    "text": text,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                    "ttl": ttl,
+                },
+            )
+        return text
+
+    def get_stats(self):
+        """キャッシュの状態を取得"""
+        with self._lock:
+            total = self.hits + self.revalidated + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "stale": self.stale,
+                "coalesced": self._flight.shared,
+                "limiter": self.limiter.get_stats() if self.limiter is not None else None,
+                "hit_rate": (
+                    round((self.hits + self.revalidated) / total * 100, 1)
+                    if total > 0
+                    else 0
+                ),
+            }
+
+
+# プロセス内で共有するインスタンス
+shared_cache = HttpCache(
+    headers={
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    }
+)
@@ -0,0 +1 @@
+"""負荷試験用のスタンドイン（Yahoo!ニュース・Gemini・Firestoreの代わり）"""
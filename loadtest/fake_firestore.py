@@ -0,0 +1,118 @@
+"""Firestoreのインメモリ版（アプリが使う操作だけ）
+
+プロセスごとに独立しているため、gunicornのワーカー間では共有されない。
+"""
+import copy
+import threading
+import uuid
+
+
+def _apply(current, data, merge):
+    """set(merge=True) と Increment を反映した新しい値を返す"""
+    result = copy.deepcopy(current) if merge and current else {}
+    for key, value in data.items():
+        if type(value).__name__ == "Increment":
+            result[key] = result.get(key, 0) + value.value
+        elif merge and isinstance(value, dict):
+            result[key] = _apply(result.get(key) or {}, value, True)
+        else:
+            result[key] = value
+    return result
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def parent(self):
+        return FakeCollection(self._db, self._collection)
+
+    def get(self):
+        with self._db._lock:
+            return FakeSnapshot(self.id, self._db._data.get(self._collection, {}).get(self.id))
+
+    def set(self, data, merge=False):
+        with self._db._lock:
+            docs = self._db._data.setdefault(self._collection, {})
+            docs[self.id] = _apply(docs.get(self.id), data, merge)
+
+    def delete(self):
+        with self._db._lock:
+            self._db._data.get(self._collection, {}).pop(self.id, None)
+
+
+class FakeQuery:
+    def __init__(self, db, collection, order=None, limit=None):
+        self._db = db
+        self._collection = collection
+        self._order = order
+        self._limit = limit
+
+    @property
+    def id(self):
+        return self._collection
+
+    def order_by(self, field, direction="ASCENDING"):
+        return FakeQuery(self._db, self._collection, (field, direction), self._limit)
+
+    def limit(self, count):
+        return FakeQuery(self._db, self._collection, self._order, count)
+
+    def stream(self):
+        with self._db._lock:
+            items = list(self._db._data.get(self._collection, {}).items())
+        if self._order:
+            field, direction = self._order
+            items.sort(key=lambda item: item[1].get(field), reverse=direction == "DESCENDING")
+        if self._limit is not None:
+            items = items[: self._limit]
+        return iter([FakeSnapshot(doc_id, copy.deepcopy(data)) for doc_id, data in items])
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id=None):
+        return FakeDocument(self._db, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append((doc_ref, data, merge))
+
+    def commit(self):
+        with self._db._lock:
+            for doc_ref, data, merge in self._writes:
+                doc_ref.set(data, merge=merge)
+
+
+class FakeFirestore:
+    """firestore.client() の代わりに FirebaseService へ渡す"""
+
+    def __init__(self):
+        self._data = {}  # コレクション名 -> {ドキュメントID: データ}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
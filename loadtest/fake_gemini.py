@@ -0,0 +1,188 @@
+"""Geminiの代わりに使う偽のモデル（レイテンシとエラー率を環境変数で設定）
+
+    FAKE_GEMINI_LATENCY_MEDIAN  応答時間の中央値（秒、既定 1.5）
+    FAKE_GEMINI_LATENCY_SIGMA   対数正規分布のσ（既定 0.5。大きいほど裾が長い）
+    FAKE_GEMINI_ERROR_RATE      500エラーの割合（既定 0.01）
+    FAKE_GEMINI_QUOTA_RATE      429（クォータ超過）の割合（既定 0）
+    FAKE_GEMINI_MALFORMED_RATE  形式が壊れた応答の割合（既定 0.02）
+    FAKE_GEMINI_MODELS          モデル名（カンマ区切り、既定 fake-flash,fake-pro）
+
+応答には usage_metadata（入力・出力トークン数）が付き、count_tokens も使える。
+入力のトークン数が多いほど応答が遅くなる。
+"""
+import json
+import os
+import random
+import re
+import time
+
+QUIZ_TEXT = """Question: {question}
+A: {a}
+B: {b}
+C: {c}
+D: {d}
+Answer: {answer}
+Explanation: {explanation}
+"""
+
+
+class ResourceExhausted(Exception):
+    """google.api_core.exceptions.ResourceExhausted と同じ名前（429として扱われる）"""
+
+
+class InternalServerError(Exception):
+    pass
+
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeTokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+def fake_token_count(text):
+    """日本語は1文字≒0.8トークンとして数える（本物のトークナイザの代わり）"""
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return int((len(text) - ascii_chars) * 0.8) + ascii_chars // 4 + 1
+
+
+class FakeStream:
+    """stream=True の応答（読み終わると usage_metadata が入る）"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.usage_metadata = None
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if chunk.usage_metadata is not None:
+                self.usage_metadata = chunk.usage_metadata
+            yield chunk
+
+
+class FakeGenerativeModel:
+    def __init__(
+        self,
+        name,
+        latency_median=1.5,
+        latency_sigma=0.5,
+        error_rate=0.01,
+        quota_rate=0.0,
+        malformed_rate=0.02,
+    ):
+        self.model_name = name
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.malformed_rate = malformed_rate
+
+    def _latency(self):
+        return self.latency_median * random.lognormvariate(0, self.latency_sigma)
+
+    def _quiz(self, prompt, number=None):
+        # 記事本文らしき部分から語句を拾って問題を作る
+        words = re.findall(r"[一-龥ァ-ヶー]{2,8}", prompt.split("文章:")[-1]) or ["ニュース"]
+        choices = random.sample(words * 4, 4)
+        quiz = {
+            "question": f"{words[0]}について正しいものはどれか？",
+            "choice_a": choices[0],
+            "choice_b": choices[1],
+            "choice_c": choices[2],
+            "choice_d": choices[3],
+            "answer": random.choice("ABCD"),
+            "explanation": f"記事によると{words[-1]}が関係している。",
+        }
+        if number is not None:
+            quiz["number"] = number
+        return quiz
+
+    def _response_text(self, prompt, generation_config):
+        count = re.search(r"(\d+)(?:問|個の記事)", prompt)
+        count = int(count.group(1)) if count else None
+        quizzes = [self._quiz(prompt, i) for i in range(1, (count or 1) + 1)]
+        if random.random() < self.malformed_rate:
+            return '{"question": "途中で切れた応答'
+
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            if count is None:
+                return json.dumps(quizzes[0], ensure_ascii=False)
+            return json.dumps(quizzes, ensure_ascii=False)
+
+        blocks = []
+        for quiz in quizzes:
+            text = QUIZ_TEXT.format(
+                question=quiz["question"],
+                a=quiz["choice_a"],
+                b=quiz["choice_b"],
+                c=quiz["choice_c"],
+                d=quiz["choice_d"],
+                answer=quiz["answer"],
+                explanation=quiz["explanation"],
+            )
+            blocks.append(f"=== {quiz['number']} ===\n{text}" if count else text)
+        return "\n".join(blocks)
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        latency = self._latency()
+        roll = random.random()
+        if roll < self.quota_rate:
+            time.sleep(min(latency, 0.2))
+            raise ResourceExhausted("429 Resource has been exhausted (fake)")
+        if roll < self.quota_rate + self.error_rate:
+            time.sleep(latency)
+            raise InternalServerError("500 An internal error has occurred (fake)")
+
+        text = self._response_text(prompt, generation_config)
+        # 入力が長いほど応答も遅くなる（1000トークンあたり中央値の2割）
+        input_tokens = fake_token_count(prompt)
+        latency *= 1 + 0.2 * input_tokens / 1000
+        usage = FakeUsage(input_tokens, fake_token_count(text))
+        if not stream:
+            time.sleep(latency)
+            return FakeChunk(text, usage)
+        return FakeStream(self._stream(text, latency, usage))
+
+    def _stream(self, text, latency, usage):
+        # 最初のチャンクまでに半分、残りを行ごとに分けて返す（最後のチャンクに使用量）
+        time.sleep(latency / 2)
+        lines = text.splitlines(keepends=True)
+        for i, line in enumerate(lines):
+            time.sleep(latency / 2 / len(lines))
+            yield FakeChunk(line, usage if i == len(lines) - 1 else None)
+
+    def count_tokens(self, contents):
+        time.sleep(0.02)
+        return FakeTokenCount(fake_token_count(contents))
+
+
+def create_models():
+    """QuizGenerator に渡す [(モデル名, モデル), ...]"""
+    names = os.environ.get("FAKE_GEMINI_MODELS", "fake-flash,fake-pro").split(",")
+    return [
+        (
+            name.strip(),
+            FakeGenerativeModel(
+                name.strip(),
+                latency_median=float(os.environ.get("FAKE_GEMINI_LATENCY_MEDIAN", 1.5)),
+                latency_sigma=float(os.environ.get("FAKE_GEMINI_LATENCY_SIGMA", 0.5)),
+                error_rate=float(os.environ.get("FAKE_GEMINI_ERROR_RATE", 0.01)),
+                quota_rate=float(os.environ.get("FAKE_GEMINI_QUOTA_RATE", 0)),
+                malformed_rate=float(os.environ.get("FAKE_GEMINI_MALFORMED_RATE", 0.02)),
+            ),
+        )
+        for name in names
+        if name.strip()
+    ]
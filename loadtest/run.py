@@ -0,0 +1,310 @@
+"""gunicornで起動したアプリに対して、複数ユーザーで5ラウンドのゲームを繰り返す負荷試験
+
+Yahoo!ニュースはスタブサーバー、GeminiとFirestoreは loadtest/ の偽物を使うため、
+外部サービスには一切アクセスしない。ワーカー数×スレッド数の組み合わせごとに
+スループットとルートごとの p50/p95/p99 を出力し、JSONで保存する。
+
+    python -m loadtest.run --users 20 --duration 60 --matrix 1x1,2x4,4x8
+
+偽のGeminiのレイテンシ・エラー率は FAKE_GEMINI_* 環境変数で変えられる
+（loadtest/fake_gemini.py を参照）。
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from loadtest.yahoo_stub import YahooStub
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Recorder:
+    """ルートごとのレイテンシとエラーを集める"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.games = 0
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok=True):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def game_finished(self):
+        with self._lock:
+            self.games += 1
+
+
+class Player:
+    """1人のユーザー（/game → /quiz GET/POST ×5 → /result）"""
+
+    def __init__(self, base_url, recorder, think_time=0.0, timeout=90):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.think_time = think_time
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _request(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.base_url + path,
+                allow_redirects=False,
+                timeout=self.timeout,
+                **kwargs,
+            )
+        except requests.RequestException:
+            self.recorder.record(route, time.perf_counter() - started, ok=False)
+            return None
+        self.recorder.record(route, time.perf_counter() - started, ok=response.status_code < 400)
+        return response
+
+    def _wait_for_quiz(self):
+        """ストリーミング配信の場合、SSEで回答できる状態になるまで待つ"""
+        started = time.perf_counter()
+        ok = False
+        try:
+            with self.session.get(
+                self.base_url + "/quiz/stream", stream=True, timeout=self.timeout
+            ) as response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line == "event: quiz":
+                        ok = True
+                        break
+                    if line == "event: error":
+                        break
+        except requests.RequestException:
+            pass
+        self.recorder.record("GET /quiz/stream", time.perf_counter() - started, ok=ok)
+        return ok
+
+    def play(self):
+        response = self._request("POST /game", "POST", "/game", data={"ai_level": "normal"})
+        if response is None or response.status_code != 302:
+            return False
+
+        for _ in range(5):
+            response = self._request("GET /quiz", "GET", "/quiz")
+            if response is None or response.status_code != 200:
+                return False
+            if re.search(r"const streamUrl = \"/", response.text) and not self._wait_for_quiz():
+                return False
+            if self.think_time:
+                time.sleep(random.uniform(0, self.think_time * 2))
+            response = self._request(
+                "POST /quiz",
+                "POST",
+                "/quiz",
+                data={"answer": random.choice("ABCD"), "time": random.uniform(3, 12)},
+            )
+            if response is None or response.status_code not in (200, 302):
+                return False
+
+        response = self._request("GET /result", "GET", "/result")
+        if response is not None and response.status_code == 200:
+            self.recorder.game_finished()
+            return True
+        return False
+
+
+def start_app(port, workers, threads, env):
+    """gunicornでアプリを起動し、応答するまで待つ"""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "app:app",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+            # スレッド1本なら従来の sync ワーカーと比べる
+            "--worker-class",
+            "sync" if threads == 1 else "gthread",
+            "--timeout",
+            "120",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicornが起動しませんでした")
+
+
+def run_config(workers, threads, args, stub):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.update(
+            {
+                "LOADTEST": "1",
+                "GEMINI_API_KEY": env.get("GEMINI_API_KEY") or "loadtest-dummy-key",
+                "YAHOO_TOPICS_URL": stub.topics_url,
+                # 試験ごとにキャッシュ・ゲーム状態を空にする
+                "QUIZ_CACHE_PATH": os.path.join(workdir, "quiz_cache.sqlite3"),
+                "ARTICLE_INDEX_PATH": os.path.join(workdir, "article_index.sqlite3"),
+                "GAME_STORE_PATH": os.path.join(workdir, "game_state.sqlite3"),
+                "SECRET_KEY": "loadtest",
+                # 回数制限は全ワーカー合計の値をワーカー数で分ける
+                "WEB_CONCURRENCY": str(workers),
+                "GEMINI_RATE_LIMIT": str(args.gemini_rate_limit),
+                "YAHOO_RATE_LIMIT": str(args.yahoo_rate_limit),
+            }
+        )
+        process = start_app(port, workers, threads, env)
+        try:
+            recorder = Recorder()
+            base_url = f"http://127.0.0.1:{port}"
+            deadline = time.time() + args.duration
+
+            def user():
+                player = Player(base_url, recorder, think_time=args.think)
+                while time.time() < deadline:
+                    if not player.play():
+                        # 失敗したら新しいユーザーとしてやり直す
+                        player = Player(base_url, recorder, think_time=args.think)
+
+            started = time.time()
+            users = [threading.Thread(target=user, daemon=True) for _ in range(args.users)]
+            for thread in users:
+                thread.start()
+            for thread in users:
+                thread.join()
+            elapsed = time.time() - started
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    return {
+        "workers": workers,
+        "threads": threads,
+        "users": args.users,
+        "duration_s": round(elapsed, 1),
+        "games": recorder.games,
+        "games_per_s": round(recorder.games / elapsed, 3),
+        "requests_per_s": round(total_requests / elapsed, 2),
+        "routes": {
+            route: {
+                "count": len(values),
+                "errors": recorder.errors.get(route, 0),
+                "p50_ms": round(percentile(values, 50) * 1000),
+                "p95_ms": round(percentile(values, 95) * 1000),
+                "p99_ms": round(percentile(values, 99) * 1000),
+                "mean_ms": round(statistics.mean(values) * 1000),
+            }
+            for route, values in sorted(recorder.latencies.items())
+        },
+    }
+
+
+def print_result(result):
+    print(
+        f"\n■ workers={result['workers']} threads={result['threads']} users={result['users']}: "
+        f"{result['games']}ゲーム, {result['games_per_s']} games/s, "
+        f"{result['requests_per_s']} req/s"
+    )
+    print(f"  {'route':<20}{'count':>7}{'errors':>8}{'p50':>8}{'p95':>8}{'p99':>8} (ms)")
+    for route, stats in result["routes"].items():
+        print(
+            f"  {route:<20}{stats['count']:>7}{stats['errors']:>8}"
+            f"{stats['p50_ms']:>8}{stats['p95_ms']:>8}{stats['p99_ms']:>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="同時に遊ぶユーザー数")
+    parser.add_argument("--duration", type=float, default=60, help="1構成あたりの秒数")
+    parser.add_argument(
+        "--matrix", default="1x1,2x4,4x8", help="ワーカー数xスレッド数（カンマ区切り）"
+    )
+    parser.add_argument("--think", type=float, default=0.0, help="回答までの平均思考時間（秒）")
+    parser.add_argument("--yahoo-latency", type=float, default=0.05, help="スタブの応答時間（秒）")
+    parser.add_argument(
+        "--broken-categories", default="", help="一覧ページが503を返すカテゴリ（カンマ区切り）"
+    )
+    parser.add_argument(
+        "--gemini-rate-limit", type=float, default=0, help="Geminiの1分あたりの上限（0なら無制限）"
+    )
+    parser.add_argument(
+        "--yahoo-rate-limit", type=float, default=0, help="Yahoo!の1分あたりの上限（0なら無制限）"
+    )
+    parser.add_argument("--output", help="結果のJSON（省略時は loadtest/results/<日時>.json）")
+    args = parser.parse_args()
+
+    stub = YahooStub(
+        latency=args.yahoo_latency,
+        broken=[name for name in args.broken_categories.split(",") if name],
+    ).start()
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "fake_gemini": {
+            key: value for key, value in os.environ.items() if key.startswith("FAKE_GEMINI_")
+        },
+        "think_time_s": args.think,
+        "results": [],
+    }
+    try:
+        for config in args.matrix.split(","):
+            workers, threads = (int(value) for value in config.lower().split("x"))
+            result = run_config(workers, threads, args, stub)
+            print_result(result)
+            report["results"].append(result)
+    finally:
+        stub.stop()
+
+    output = (
+        Path(args.output)
+        if args.output
+        else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", "utf-8")
+    print(f"\n結果を保存しました: {output}")
+
+
+if __name__ == "__main__":
+    main()
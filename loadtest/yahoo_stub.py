@@ -0,0 +1,166 @@
+"""Yahoo!ニュースの代わりに記事一覧と記事ページを返すHTTPサーバー
+
+    /topics/<カテゴリ>  newsFeed_list に /pickup/<番号> へのリンクを並べた一覧
+                       （カテゴリごとに記事番号の範囲がずれる。broken のカテゴリは503）
+    /pickup/<番号>      要約と「記事全文を読む」リンク（data-ual-gotocontent）のページ
+    /articles/<番号>    memo.txt を元にした記事ページ（番号ごとに本文の冒頭が変わる）
+
+番号の1の位が9の記事は、1つ前の記事と同じニュースを別の配信元が報じたものになる
+（見出しと末尾の一文だけが違う。重複した記事を出題しないかの確認用）。
+
+    python -m loadtest.yahoo_stub [ポート]
+"""
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+NAV = "".join(f'<li><a href="/categories/{i}">カテゴリ{i}</a></li>' for i in range(200))
+COMPANIES = [
+    "トヨタ自動車", "ソニーグループ", "日立製作所", "三菱商事", "任天堂", "キーエンス",
+    "東京エレクトロン", "武田薬品工業", "三井住友銀行", "KDDI", "日本製鉄", "パナソニック",
+    "伊藤忠商事", "本田技研工業", "セブン＆アイ", "ファナック", "信越化学工業", "花王",
+]
+TOPICS = [
+    "決算", "設備投資", "賃上げ", "自社株買い", "新工場の建設", "海外企業の買収",
+    "製品の値上げ", "人員の再配置", "増配", "新製品の発売", "事業の売却", "業務提携",
+]
+
+
+class YahooStub:
+    def __init__(self, port=0, articles=200, links_per_page=25, latency=0.0, broken=()):
+        self.articles = articles
+        self.links_per_page = links_per_page
+        self.latency = latency
+        # 一覧ページが503を返すカテゴリ（1つのカテゴリの障害が他に響かないかの確認用）
+        self.broken = set(broken)
+        self.requests = 0
+        self._body = (ROOT / "memo.txt").read_text(encoding="utf-8")
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def topics_url(self):
+        return f"{self.base_url}/topics/business"
+
+    def _page(self, content, title="Yahoo!ニュース"):
+        return (
+            f"<html><head><title>{title}</title></head><body><header><ul>{NAV}</ul></header>"
+            f"<main>{content}</main><footer><ul>{NAV}</ul></footer></body></html>"
+        )
+
+    def topics_page(self, category="business"):
+        # 呼ぶたびに一覧の記事が入れ替わる（実際のトピックの更新を模す）
+        offset = zlib.crc32(category.encode("utf-8"))
+        start = (int(time.time() // 60) + offset) % self.articles
+        items = "".join(
+            f'<li class="newsFeed_item"><a href="{self.base_url}/pickup/{(start + i) % self.articles}">'
+            f"ニュース見出し{(start + i) % self.articles}</a></li>"
+            for i in range(self.links_per_page)
+        )
+        return self._page(f'<ul class="newsFeed_list">{items}</ul>')
+
+    def pickup_page(self, number):
+        return self._page(
+            f"<h1>ニュース見出し{number}</h1>{self.lead_paragraph(self.story_of(number), 12)}"
+            f'<a data-ual-gotocontent="true" href="/articles/{number}">記事全文を読む</a>'
+        )
+
+    def story_of(self, number):
+        """記事番号 → ニュースの番号（1の位が9の記事は1つ前と同じニュース）"""
+        return number - 1 if number % 10 == 9 else number
+
+    def lead_paragraph(self, story, count=40):
+        """ニュースごとに決まる冒頭の段落（本文の半分ほどがニュースごとに変わる）"""
+        rng = random.Random(story)
+        templates = [
+            "{company}は{month}月{day}日、{topic}に{amount}億円を充てると発表した。",
+            "{topic}をめぐり、{company}の株価は一時{amount}円まで上昇した。",
+            "関係者によると、{company}は{month}月までに{topic}の方針を固める見通しだ。",
+            "{company}の{topic}について、市場では{amount}億円規模との見方が出ている。",
+        ]
+        sentences = [
+            rng.choice(templates).format(
+                company=rng.choice(COMPANIES),
+                topic=rng.choice(TOPICS),
+                month=rng.randint(1, 12),
+                day=rng.randint(1, 28),
+                amount=rng.randint(10, 9999),
+            )
+            for _ in range(count)
+        ]
+        return f"<p>{''.join(sentences)}</p>"
+
+    def article_page(self, number):
+        # 本文の先頭にニュースごとの段落を入れ、記事ごとに本文が変わるようにする
+        story = self.story_of(number)
+        lead = self.lead_paragraph(story)
+        if story != number:
+            lead += f"<p>（配信元{number}）</p>"
+        body = re.sub(
+            r"(<div class=\"article_body[^>]*>)",
+            lambda match: match.group(1) + lead,
+            self._body,
+            count=1,
+        )
+        return self._page(f"<h1>ニュース見出し{number}</h1>{body}", title=f"記事{number}")
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                match = re.fullmatch(r"/(pickup|articles)/(\d+)", self.path)
+                topics = re.fullmatch(r"/topics/([\w-]+)", self.path)
+                if topics and topics.group(1) in stub.broken:
+                    self.send_error(503)
+                    return
+                if topics:
+                    html = stub.topics_page(topics.group(1))
+                elif match and match.group(1) == "pickup":
+                    html = stub.pickup_page(int(match.group(2)))
+                elif match:
+                    html = stub.article_page(int(match.group(2)))
+                else:
+                    self.send_error(404)
+                    return
+                data = html.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    stub = YahooStub(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8001)
+    print(f"Yahoo!ニュースのスタブ: {stub.topics_url}")
+    stub._server.serve_forever()
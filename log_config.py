@@ -0,0 +1,101 @@
+"""ログの設定（1行1件のJSON。request_id・game_id はリクエストのコンテキストから自動で付く）
+
+    LOG_LEVEL        出力するレベル（既定 INFO。DEBUGで問題文・回答なども出る）
+    LOG_FORMAT       json または text（既定 json。手元で読むときは text）
+    LOG_SAMPLE_RATE  Geminiの生の応答など大きなデバッグ出力を残す割合（既定 0.01）
+
+各モジュールでは logger = logging.getLogger(__name__) を使い、値は
+logger.info("...: %s", 値, extra={"項目": 値}) のように渡す。
+無効なレベルのログは文字列の組み立てもされない。
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime
+
+# configure() で LOG_SAMPLE_RATE から設定する（.env の読み込み後に呼ばれるため）
+SAMPLE_RATE = 0.01
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# LogRecord が元から持つ属性（これ以外は extra で渡された項目として出力する）
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+_context = contextvars.ContextVar("log_context", default=None)
+_handler = None
+
+
+def set_context(**fields):
+    """このリクエスト（コンテキスト）のログに付ける項目を設定"""
+    context = dict(_context.get() or {})
+    context.update(fields)
+    _context.set(context)
+
+
+def clear_context():
+    _context.set(None)
+
+
+def sampled(rate=None):
+    """大きなデバッグ出力を残すかどうか（LOG_SAMPLE_RATE の割合でTrue）"""
+    return random.random() < (SAMPLE_RATE if rate is None else rate)
+
+
+class ContextFilter(logging.Filter):
+    """コンテキストの request_id・game_id をレコードに付ける"""
+
+    def filter(self, record):
+        context = _context.get()
+        if context:
+            for key, value in context.items():
+                if key not in record.__dict__:
+                    setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure(level=None, fmt=None, sample_rate=None):
+    """ルートロガーに標準出力へのハンドラを付ける（何度呼んでも1つだけ）"""
+    global _handler, SAMPLE_RATE
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("LOG_FORMAT", "json")).lower()
+    SAMPLE_RATE = float(
+        os.environ.get("LOG_SAMPLE_RATE", 0.01) if sample_rate is None else sample_rate
+    )
+
+    root = logging.getLogger()
+    if _handler is None:
+        _handler = logging.StreamHandler(sys.stdout)
+        _handler.addFilter(ContextFilter())
+        root.addHandler(_handler)
+    _handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    root.setLevel(level)
+    # 出力しない呼び出し元の行番号・プロセス情報は集めない（ロギングのドキュメントの最適化の節）
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    # ライブラリの細かいログは出さない
+    for name in ("urllib3", "google", "grpc"):
+        logging.getLogger(name).setLevel(max(logging.getLevelName(level), logging.WARNING))
@@ -0,0 +1,117 @@
+"""処理フェーズごとの所要時間を集計し、Prometheusのテキスト形式で出力する
+
+    with metrics.span("topics_fetch"):
+        ...
+
+route と ai_level はリクエストごとのコンテキストから自動で付く。
+集計はワーカープロセスごとなので、/metrics はそのワーカーの値を返す。
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+# 秒単位のバケット（Gemini呼び出しの数十秒まで）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+LABELS = ("route", "phase", "model", "ai_level")
+METRIC_NAME = "quiz_phase_duration_seconds"
+
+# バックグラウンドのスレッドでは route="background" になる
+_context = contextvars.ContextVar("metrics_context", default=None)
+
+_series = {}  # ラベルの値のタプル -> [バケットごとの件数..., 合計秒数, 件数]
+_lock = threading.Lock()
+
+
+def set_context(**labels):
+    """このリクエスト（コンテキスト）で記録するスパンに付けるラベルを設定"""
+    context = dict(_context.get() or {})
+    context.update(labels)
+    _context.set(context)
+
+
+def clear_context():
+    _context.set(None)
+
+
+def observe(phase, seconds, **labels):
+    """phase の所要時間を記録"""
+    context = _context.get() or {}
+    key = (
+        labels.get("route") or context.get("route") or "background",
+        phase,
+        labels.get("model") or context.get("model") or "",
+        labels.get("ai_level") or context.get("ai_level") or "",
+    )
+    index = bisect.bisect_left(BUCKETS, seconds)
+    with _lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = [0] * (len(BUCKETS) + 2)
+        if index < len(BUCKETS):
+            series[index] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+
+class span:
+    """with文で囲んだ区間の所要時間を記録する（途中で labels を追加できる）"""
+
+    def __init__(self, phase, **labels):
+        self.phase = phase
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.phase, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def timed(phase):
+    """関数全体の所要時間を phase として記録するデコレータ"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render():
+    """Prometheusのテキスト形式（version 0.0.4）で出力"""
+    with _lock:
+        snapshot = {key: list(series) for key, series in _series.items()}
+
+    lines = [
+        f"# HELP {METRIC_NAME} 処理フェーズごとの所要時間",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for key in sorted(snapshot):
+        series = snapshot[key]
+        labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(LABELS, key))
+        cumulative = 0
+        for bound, count in zip(BUCKETS, series):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {series[-2]:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {series[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """集計をすべて破棄（fork後やテスト用）"""
+    with _lock:
+        _series.clear()
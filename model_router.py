@@ -0,0 +1,268 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ModelUnavailableError(Exception):
+    """すべてのモデルのサーキットが開いている"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"利用可能なGeminiモデルがありません（{retry_after:.0f}秒後に再試行）")
+        self.retry_after = retry_after
+
+
+def percentile(values, p):
+    """values の p パーセンタイル（空ならNone）"""
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def is_quota_error(error):
+    """レート制限・クォータ超過のエラーか（429 / ResourceExhausted）"""
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(
+        error
+    )
+
+
+class ModelHealth:
+    """1つのモデルの直近の呼び出し結果とサーキットの状態"""
+
+    def __init__(self, name, model, priority, window):
+        self.name = name
+        self.model = model
+        self.priority = priority  # 設定順（小さいほど優先）
+        self.outcomes = deque(maxlen=window)  # (時刻, 所要秒数, 結果)
+        self.state = CLOSED
+        self.open_until = 0
+        self.cooldown = 0
+        self.consecutive_failures = 0
+        self.probing = False
+        self.trips = 0
+
+    def recent(self, now, window_seconds):
+        return [o for o in self.outcomes if now - o[0] <= window_seconds]
+
+
+class ModelRouter:
+    """呼び出しごとに最も健全なGeminiモデルを選ぶ
+
+    モデルごとに直近のレイテンシ・エラー率・クォータ超過率を記録し、
+    失敗が続いたモデルはサーキットを開いて一定時間使わない。
+    時間が経つと1件だけ試しに流し（half-open）、成功すれば元に戻す。
+    """
+
+    def __init__(
+        self,
+        models,
+        window=50,
+        window_seconds=300,
+        failure_threshold=3,
+        error_rate_threshold=0.5,
+        min_requests=10,
+        open_duration=30,
+        max_open_duration=300,
+        quota_open_duration=60,
+        default_latency=5.0,
+    ):
+        # models: [(モデル名, モデル), ...] 先頭ほど優先
+        self.window_seconds = window_seconds
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.open_duration = open_duration
+        self.max_open_duration = max_open_duration
+        self.quota_open_duration = quota_open_duration
+        self.default_latency = default_latency
+
+        self._models = [
+            ModelHealth(name, model, priority, window)
+            for priority, (name, model) in enumerate(models)
+        ]
+        self._lock = threading.Lock()
+
+    @property
+    def model_names(self):
+        return [health.name for health in self._models]
+
+    # --------------------------
+    # モデルの選択
+    # --------------------------
+    def _score(self, health, now):
+        """ロック取得中に呼び出すこと。小さいほど健全"""
+        recent = health.recent(now, self.window_seconds)
+        latencies = [o[1] for o in recent if o[2] == "ok"]
+        latency = percentile(latencies, 50) if latencies else self.default_latency
+        errors = sum(1 for o in recent if o[2] != "ok")
+        error_rate = errors / len(recent) if recent else 0
+        # エラーは再試行のコストがかかるので重めに見る。同程度なら設定順
+        return latency * (1 + 4 * error_rate) + health.priority * 0.1
+
+    def acquire(self, exclude=()):
+        """使うモデルを選ぶ。サーキットが開いていて選べなければ ModelUnavailableError"""
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for health in self._models:
+                if health.name in exclude:
+                    continue
+                if health.state == OPEN and now >= health.open_until:
+                    health.state = HALF_OPEN
+                if health.state == HALF_OPEN:
+                    if not health.probing:
+                        # 回復確認のため1件だけ流す
+                        health.probing = True
+                        return health
+                    continue
+                if health.state == CLOSED:
+                    candidates.append(health)
+
+            if candidates:
+                return min(candidates, key=lambda health: self._score(health, now))
+
+            waits = [
+                health.open_until - now
+                for health in self._models
+                if health.name not in exclude and health.state == OPEN
+            ]
+        raise ModelUnavailableError(max(0, min(waits)) if waits else self.open_duration)
+
+    def record(self, health, latency, error=None):
+        """呼び出し結果を記録し、必要ならサーキットを開閉する"""
+        now = time.time()
+        with self._lock:
+            probing, health.probing = health.probing, False
+            if error is None:
+                health.outcomes.append((now, latency, "ok"))
+                health.consecutive_failures = 0
+                if health.state != CLOSED:
+                    logger.info("'%s' が回復しました", health.name)
+                health.state = CLOSED
+                health.cooldown = 0
+                return
+
+            quota = is_quota_error(error)
+            health.outcomes.append((now, latency, "quota" if quota else "error"))
+            health.consecutive_failures += 1
+
+            recent = health.recent(now, self.window_seconds)
+            error_rate = sum(1 for o in recent if o[2] != "ok") / len(recent)
+            if (
+                quota
+                or probing
+                or health.consecutive_failures >= self.failure_threshold
+                or (len(recent) >= self.min_requests and error_rate >= self.error_rate_threshold)
+            ):
+                self._trip(health, now, quota)
+
+    def _trip(self, health, now, quota):
+        """ロック取得中に呼び出すこと。失敗が続くほど長く開く"""
+        if quota:
+            duration = max(self.quota_open_duration, health.cooldown)
+        elif health.cooldown:
+            duration = min(self.max_open_duration, health.cooldown * 2)
+        else:
+            duration = self.open_duration
+        health.cooldown = duration
+        health.state = OPEN
+        health.open_until = now + duration
+        health.trips += 1
+        logger.warning("'%s' のサーキットを%.0f秒間開きます", health.name, duration)
+
+    def call(self, fn, avoid=(), on_start=None):
+        """fn(model) を最も健全なモデルで呼ぶ。例外が出たら別のモデルで再試行
+
+        avoid のモデルは、他に使えるモデルがあれば避ける。
+        on_start を渡すと、モデルを選ぶたびにモデル名を渡して呼ぶ。
+        戻り値は (fn の戻り値, 使ったモデル名)。
+        """
+        tried = set()
+        last_error = None
+        while True:
+            try:
+                try:
+                    health = self.acquire(exclude=tried | set(avoid))
+                except ModelUnavailableError:
+                    if not avoid:
+                        raise
+                    health = self.acquire(exclude=tried)
+            except ModelUnavailableError:
+                if last_error is not None:
+                    raise last_error
+                raise
+            tried.add(health.name)
+            if on_start is not None:
+                on_start(health.name)
+            started = time.time()
+            try:
+                result = fn(health.model)
+            except Exception as e:
+                self.record(health, time.time() - started, e)
+                logger.warning("'%s' の呼び出しに失敗 - %s", health.name, e)
+                last_error = e
+                continue
+            self.record(health, time.time() - started)
+            return result, health.name
+
+    def latency_percentile(self, p, min_samples=1):
+        """全モデルの直近の成功レイテンシ（秒）の p パーセンタイル。少なければNone"""
+        now = time.time()
+        with self._lock:
+            latencies = [
+                o[1]
+                for health in self._models
+                for o in health.recent(now, self.window_seconds)
+                if o[2] == "ok"
+            ]
+        if len(latencies) < min_samples:
+            return None
+        return percentile(latencies, p)
+
+    # --------------------------
+    # 監視用
+    # --------------------------
+    def get_stats(self):
+        """モデルごとの状態を取得"""
+        now = time.time()
+        stats = []
+        with self._lock:
+            for health in self._models:
+                recent = health.recent(now, self.window_seconds)
+                latencies = [o[1] for o in recent if o[2] == "ok"]
+                errors = sum(1 for o in recent if o[2] == "error")
+                quota = sum(1 for o in recent if o[2] == "quota")
+
+                def ms(p):
+                    value = percentile(latencies, p)
+                    return round(value * 1000) if value is not None else None
+
+                stats.append(
+                    {
+                        "model": health.name,
+                        "state": health.state,
+                        "requests": len(recent),
+                        "error_rate": round(errors / len(recent), 3) if recent else 0,
+                        "quota_rate": round(quota / len(recent), 3) if recent else 0,
+                        "latency_p50_ms": ms(50),
+                        "latency_p90_ms": ms(90),
+                        "latency_p99_ms": ms(99),
+                        "consecutive_failures": health.consecutive_failures,
+                        "trips": health.trips,
+                        "open_for": (
+                            round(max(0, health.open_until - now), 1)
+                            if health.state == OPEN
+                            else 0
+                        ),
+                        "score": round(self._score(health, now), 3),
+                    }
+                )
+        return stats
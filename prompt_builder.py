@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import Counter, OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# 記事本文に使うトークン数の上限（プロンプトの指示文は含まない）
+DEFAULT_TOKEN_BUDGET = 500
+# 予算を超えたときに文を減らして数え直す回数
+MAX_RECOUNTS = 3
+# ニュースは冒頭の文ほど要点を含む（リード文）
+LEAD_SENTENCES = 2
+LEAD_BONUS = 1.5
+
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?\n]+[。！？!?]?")
+_TERM_PATTERN = re.compile(r"[一-龥々]{2,}|[ァ-ヶー]{2,}|[A-Za-zＡ-Ｚａ-ｚ]{2,}")
+_NUMBER_PATTERN = re.compile(r"[0-9０-９]+(?:[.,．][0-9０-９]+)*")
+
+
+def split_sentences(text):
+    """本文を「。」などの文末で分ける（空の文・同じ文の繰り返しは除く）"""
+    sentences = []
+    seen = set()
+    for match in _SENTENCE_PATTERN.finditer(text or ""):
+        sentence = match.group().strip()
+        if sentence and sentence not in seen:
+            seen.add(sentence)
+            sentences.append(sentence)
+    return sentences
+
+
+def estimate_tokens(text):
+    """トークン数の見積もり（日本語は1文字≒1トークン、英数字は4文字≒1トークン）
+
+    Geminiの実際の数より少し多めになるため、予算を超えにくい。
+    """
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return len(text) - ascii_chars + (ascii_chars + 3) // 4
+
+
+def score_sentences(sentences):
+    """文ごとの情報量のスコア
+
+    記事の中で何度も出てくる語（固有名詞・漢字の複合語）と数値を多く含む文ほど高く、
+    長さで割って密度にする。冒頭の文は少し優遇する。
+    """
+    terms = [set(_TERM_PATTERN.findall(sentence)) for sentence in sentences]
+    frequency = Counter(term for sentence_terms in terms for term in sentence_terms)
+    scores = []
+    for i, sentence in enumerate(sentences):
+        score = sum(frequency[term] for term in terms[i])
+        score += 2 * len(_NUMBER_PATTERN.findall(sentence))
+        score /= max(estimate_tokens(sentence), 1) ** 0.5
+        if i < LEAD_SENTENCES:
+            score *= LEAD_BONUS
+        scores.append(score)
+    return scores
+
+
+class TokenCounter:
+    """モデルの count_tokens でトークン数を数える（同じテキストの結果はキャッシュ）
+
+    count_tokens を持たないモデル・失敗した場合は estimate_tokens の見積もりを使う。
+    """
+
+    def __init__(self, model=None, maxsize=2048):
+        self.model = model
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def count(self, text):
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        tokens = None
+        if self.model is not None and hasattr(self.model, "count_tokens"):
+            try:
+                tokens = self.model.count_tokens(text).total_tokens
+            except Exception as e:
+                self.errors += 1
+                logger.debug("count_tokens に失敗、見積もりを使います: %s", e)
+        if tokens is None:
+            # 見積もりはキャッシュしない（次はAPIで数えられるかもしれない）
+            return estimate_tokens(text)
+
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups * 100, 1) if lookups > 0 else 0,
+        }
+
+
+class PromptBuilder:
+    """記事本文から情報量の多い文を選び、トークン数の予算内に収める
+
+    選んだ文は元の順に並べ直す。本文が予算内ならそのまま返す。
+    counter（count_tokens）で数えるのは見積もりが予算を超えたときだけで、
+    実際に使ったトークン数は応答の usage_metadata で集計する。
+    """
+
+    def __init__(self, counter=None, budget=DEFAULT_TOKEN_BUDGET):
+        self.counter = counter or TokenCounter()
+        self.budget = budget
+
+    def build(self, text, budget=None):
+        budget = budget or self.budget
+        text = (text or "").strip()
+        if estimate_tokens(text) <= budget:
+            return text
+        sentences = split_sentences(text)
+        if len(sentences) <= 1:
+            return text
+
+        scores = score_sentences(sentences)
+        ranked = sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True)
+        selected = []
+        used = 0
+        for i in ranked:
+            tokens = estimate_tokens(sentences[i])
+            if used + tokens <= budget:
+                selected.append(i)
+                used += tokens
+        if not selected:
+            # 1文だけで予算を超える場合は先頭から切る
+            return text[:budget]
+
+        # 見積もりは実際より多めなので、見積もりで収まっていれば数え直さない
+        # （count_tokens は生成のたびの往復になる）。超えたら情報量の低い文から外す
+        for _ in range(MAX_RECOUNTS):
+            body = "".join(sentences[i] for i in sorted(selected))
+            if len(selected) == 1 or estimate_tokens(body) <= budget:
+                return body
+            if self.counter.count(body) <= budget:
+                return body
+            selected.remove(min(selected, key=lambda i: scores[i]))
+        return "".join(sentences[i] for i in sorted(selected))
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class TokenUsage:
+    """Gemini呼び出しごとの入力・出力トークン数（usage_metadata）を集計する"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._recent = {"input": deque(maxlen=window), "output": deque(maxlen=window)}
+        self.totals = {}  # モデル名 -> {"calls", "input", "output"}
+
+    def record(self, model_name, input_tokens, output_tokens):
+        with self._lock:
+            totals = self.totals.setdefault(model_name, {"calls": 0, "input": 0, "output": 0})
+            totals["calls"] += 1
+            totals["input"] += input_tokens
+            totals["output"] += output_tokens
+            self._recent["input"].append(input_tokens)
+            self._recent["output"].append(output_tokens)
+
+    def get_stats(self):
+        """直近の呼び出しの p50/p90/平均と、モデルごとの合計"""
+        with self._lock:
+            recent = {key: sorted(values) for key, values in self._recent.items()}
+            totals = {name: dict(values) for name, values in self.totals.items()}
+        distribution = {
+            key: (
+                {
+                    "p50": _percentile(values, 50),
+                    "p90": _percentile(values, 90),
+                    "mean": round(sum(values) / len(values), 1),
+                }
+                if values
+                else None
+            )
+            for key, values in recent.items()
+        }
+        return {**distribution, "models": totals}
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """全角・半角や空白の揺れを吸収してからハッシュする"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+class QuizCache:
+    """記事本文のハッシュをキーにした生成済みクイズのSQLiteキャッシュ
+
+    gunicornの複数ワーカーや再起動をまたいで共有できるよう、ファイルに保存する。
+    """
+
+    def __init__(self, path="quiz_cache.sqlite3", ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        # 統計情報（プロセス単位）
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quiz_cache (
+                key TEXT PRIMARY KEY,
+                quiz TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS quiz_cache_last_access ON quiz_cache (last_access)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        """スレッドごとに接続を持つ（fork後は作り直す）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(text, prompt_version, model_name):
+        payload = "\0".join([prompt_version, model_name, normalize_text(text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """キャッシュ済みのクイズを返す。なければNone"""
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT quiz, created_at FROM quiz_cache WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row and now - row[1] <= self.ttl:
+                conn.execute(
+                    "UPDATE quiz_cache SET last_access = ? WHERE key = ?", (now, key)
+                )
+                conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                conn.execute("DELETE FROM quiz_cache WHERE key = ?", (key,))
+                conn.commit()
+        except Exception as e:
+            logger.error("読み込みエラー - %s", e)
+        self.misses += 1
+        return None
+
+    def put(self, key, quiz_data):
+        """クイズを保存し、サイズ上限を超えた分を古い順に削除"""
+        try:
+            data = json.dumps(quiz_data, ensure_ascii=False)
+            now = time.time()
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO quiz_cache VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), now, now),
+            )
+            conn.execute("DELETE FROM quiz_cache WHERE created_at < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM quiz_cache").fetchone()[0]
+            if total > self.max_bytes:
+                # 最近使われていないものから、上限の9割まで削る
+                excess = total - int(self.max_bytes * 0.9)
+                rows = conn.execute(
+                    "SELECT key, size FROM quiz_cache ORDER BY last_access"
+                ).fetchall()
+                evict = []
+                for row_key, size in rows:
+                    if excess <= 0:
+                        break
+                    evict.append((row_key,))
+                    excess -= size
+                conn.executemany("DELETE FROM quiz_cache WHERE key = ?", evict)
+            conn.commit()
+        except Exception as e:
+            logger.error("書き込みエラー - %s", e)
+
+    def get_stats(self):
+        """ヒット率と保存サイズを取得"""
+        entries, stored = 0, 0
+        try:
+            entries, stored = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM quiz_cache"
+            ).fetchone()
+        except Exception as e:
+            logger.error("統計取得エラー - %s", e)
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes_stored": stored,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total > 0 else 0,
+        }
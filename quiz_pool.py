@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class QuizPool:
+    """生成済みクイズをバックグラウンドで補充しておくプール"""
+
+    def __init__(
+        self,
+        producer,
+        low_water=2,
+        min_target=3,
+        max_target=20,
+        max_age=600,
+        workers=2,
+        rate_window=300,
+    ):
+        # producer: 引数なしで呼び出すとクイズ(dict)、クイズのリスト、またはNoneを返す関数
+        self.producer = producer
+        self.low_water = low_water
+        self.min_target = min_target
+        self.max_target = max_target
+        self.max_age = max_age
+        self.workers = workers
+        self.rate_window = rate_window
+
+        self._items = deque()  # (作成時刻, クイズ)
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Condition(self._lock)
+        self._threads = []
+        self._stopped = False
+        self._in_flight = 0
+        self._target = min_target
+
+        # 統計情報
+        self._request_times = deque()
+        self._refill_latencies = deque(maxlen=100)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.refill_failures = 0
+
+    # --------------------------
+    # ワーカー管理
+    # --------------------------
+    def start(self):
+        """補充ワーカーを起動（既に起動済みなら何もしない）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped = False
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._refill_loop, name=f"quiz-pool-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info("補充ワーカーを%d件起動しました", self.workers)
+
+    def stop(self):
+        """補充ワーカーを停止"""
+        with self._lock:
+            self._stopped = True
+            self._refill_needed.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout=1)
+
+    def _needs_refill(self):
+        """ロック取得中に呼び出すこと"""
+        return len(self._items) + self._in_flight < self._target
+
+    def _refill_loop(self):
+        failures = 0
+        while True:
+            with self._lock:
+                while not self._stopped and not self._needs_refill():
+                    # 期限切れを捨てるため定期的に起きる
+                    self._refill_needed.wait(timeout=30)
+                    self._evict_expired()
+                    # 取り出しが途絶えたら目標を0にし、期限切れの分を補充しない
+                    self._update_target(time.time())
+                if self._stopped:
+                    return
+                self._in_flight += 1
+
+            started = time.time()
+            quizzes = []
+            retry_after = None
+            try:
+                quizzes = self._produce()
+            except Exception as e:
+                # 回数制限・サーキットが開いている場合は再開できる時刻が分かる
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None:
+                    logger.error("補充中にエラー - %s", e)
+                else:
+                    logger.info("補充を%.1f秒待ちます - %s", retry_after, e)
+
+            with self._lock:
+                self._in_flight -= 1
+                if quizzes:
+                    now = time.time()
+                    self._add(quizzes, now)
+                    self._refill_latencies.append(now - started)
+                else:
+                    self.refill_failures += 1
+
+            if quizzes:
+                failures = 0
+            elif retry_after is not None:
+                time.sleep(retry_after)
+            else:
+                # 連続失敗でAPIを叩き続けないよう少し待つ
+                failures += 1
+                time.sleep(min(30, 2 ** min(failures, 5)))
+
+    # --------------------------
+    # プール操作
+    # --------------------------
+    def _produce(self):
+        """producerの結果を常にリストで返す"""
+        result = self.producer()
+        if isinstance(result, list):
+            return [quiz for quiz in result if quiz]
+        return [result] if result else []
+
+    def _add(self, quizzes, now):
+        """ロック取得中に呼び出すこと。max_target を超えた分は古いものから捨てる"""
+        self._items.extend((now, quiz) for quiz in quizzes)
+        while len(self._items) > self.max_target:
+            self._items.popleft()
+            self.evicted += 1
+
+    def _evict_expired(self):
+        """ロック取得中に呼び出すこと"""
+        now = time.time()
+        while self._items and now - self._items[0][0] > self.max_age:
+            self._items.popleft()
+            self.evicted += 1
+
+    def _find(self, category):
+        """取り出すクイズの位置（ロック取得中）。category がなければ一番古いもの"""
+        if category is None:
+            return 0 if self._items else None
+        for index, (_, quiz) in enumerate(self._items):
+            if quiz.get("category") == category:
+                return index
+        return None
+
+    def _update_target(self, now):
+        """直近のリクエスト頻度と補充時間から目標サイズを決める（ロック取得中）
+
+        直近 rate_window 秒に取り出しがなければ0（使われないまま期限切れになるだけなので補充しない）。
+        """
+        while self._request_times and now - self._request_times[0] > self.rate_window:
+            self._request_times.popleft()
+        if not self._request_times:
+            self._target = 0
+            return
+
+        rate = len(self._request_times) / self.rate_window  # 件/秒
+        latency = (
+            sum(self._refill_latencies) / len(self._refill_latencies)
+            if self._refill_latencies
+            else 5.0
+        )
+        # 補充にかかる時間内に来るリクエスト数の2倍を確保する
+        wanted = int(rate * latency * 2 / max(self.workers, 1)) + self.low_water
+        self._target = max(self.min_target, min(self.max_target, wanted))
+
+    def get(self, fallback=True, category=None):
+        """プールからクイズを取り出す。空の場合は同期生成にフォールバック
+
+        fallback=False の場合は空ならすぐにNoneを返す。
+        category を指定するとそのカテゴリのクイズだけを探す（なければNone）。
+        """
+        if not self._threads:
+            self.start()
+
+        now = time.time()
+        quiz = None
+        with self._lock:
+            self._request_times.append(now)
+            self._update_target(now)
+            self._evict_expired()
+            index = self._find(category)
+            if index is not None:
+                quiz = self._items[index][1]
+                del self._items[index]
+                self.hits += 1
+            else:
+                self.misses += 1
+            if len(self._items) <= self.low_water or self._needs_refill():
+                self._refill_needed.notify_all()
+
+        if quiz or not fallback or category is not None:
+            return quiz
+
+        logger.info("プールが空のため同期生成します")
+        quizzes = self._produce()
+        if not quizzes:
+            return None
+        if len(quizzes) > 1:
+            # 一括生成の余りはプールに入れておく
+            with self._lock:
+                self._add(quizzes[1:], time.time())
+        return quizzes[0]
+
+    def get_stats(self):
+        """プールの状態を取得"""
+        with self._lock:
+            latencies = sorted(self._refill_latencies)
+            total = self.hits + self.misses
+            return {
+                "depth": len(self._items),
+                "target": self._target,
+                "low_water": self.low_water,
+                "in_flight": self._in_flight,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 1) if total > 0 else 0,
+                "evicted": self.evicted,
+                "refill_failures": self.refill_failures,
+                "refill_latency_avg": (
+                    round(sum(latencies) / len(latencies), 3) if latencies else 0
+                ),
+                "refill_latency_p90": (
+                    round(latencies[int(len(latencies) * 0.9)], 3) if latencies else 0
+                ),
+                "oldest_age": (
+                    round(time.time() - self._items[0][0], 1) if self._items else 0
+                ),
+            }
@@ -0,0 +1,172 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _GameProgress:
+    """このプロセスで生成中のゲーム（完了した順にラウンドへ割り当てる）"""
+
+    def __init__(self, rounds):
+        self.rounds = rounds
+        self.ready = 0
+        self.failed = 0
+        # 同じゲームの保存を順番に行う（ストアの書き込みは全体のロックの外で行う）
+        self.lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self.rounds - self.ready - self.failed
+
+    def status(self):
+        return {
+            "rounds": self.rounds,
+            "ready": self.ready,
+            "failed": self.failed,
+        }
+
+
+class QuizPrefetcher:
+    """ゲーム開始時に全ラウンドのクイズを並行して生成し、ゲーム状態ストアに置いておく
+
+    生成はプロセス全体で workers 本のスレッドで行い、できた順に
+    "<ゲームID>:quiz:<番号>" のキーで保存する（先にできたものから1問目にする）。
+    進み具合は "<ゲームID>:prefetch" に保存するため、別のワーカーでも待てる。
+    ゲーム本体とは別のキーなので、回答の保存と書き込みが競合しない。
+    """
+
+    def __init__(self, producer, store, workers=8, poll_interval=0.25):
+        # producer: producer(category) でクイズ(dict)またはNoneを返す関数
+        self.producer = producer
+        self.store = store
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._games = {}  # ゲームID -> _GameProgress
+        self._changed = threading.Condition()
+
+        # 統計情報
+        self.games = 0
+        self.generated = 0
+        self.failures = 0
+        self.hits = 0
+        self.misses = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+
+    @staticmethod
+    def _quiz_key(game_id, number):
+        return f"{game_id}:quiz:{number}"
+
+    @staticmethod
+    def _status_key(game_id):
+        return f"{game_id}:prefetch"
+
+    def start(self, game_id, rounds, category=None):
+        """rounds 問の生成を開始する（すぐに戻る）"""
+        progress = _GameProgress(rounds)
+        with self._changed:
+            self._games[game_id] = progress
+            self.games += 1
+        self.store.put(self._status_key(game_id), progress.status())
+        for _ in range(rounds):
+            # 計測・ログのラベル（route・game_id等）を生成スレッドに引き継ぐ
+            context = contextvars.copy_context()
+            self._executor.submit(context.run, self._run, game_id, category)
+
+    def _run(self, game_id, category):
+        quiz = None
+        try:
+            quiz = self.producer(category)
+        except Exception as e:
+            # 回数制限などで生成できなかったラウンドは、出題時に従来どおり生成する
+            logger.warning("生成エラー - %s", e)
+
+        with self._changed:
+            progress = self._games[game_id]
+        with progress.lock:
+            # クイズを保存してから完了数を増やす（待っている側は完了数を見て読みに来る）
+            if quiz:
+                self.store.put(self._quiz_key(game_id, progress.ready), quiz)
+            with self._changed:
+                if quiz:
+                    progress.ready += 1
+                    self.generated += 1
+                else:
+                    progress.failed += 1
+                    self.failures += 1
+            self.store.put(self._status_key(game_id), progress.status())
+            with self._changed:
+                if not progress.pending:
+                    del self._games[game_id]
+                self._changed.notify_all()
+
+    def _wait_local(self, game_id, number, deadline):
+        """このプロセスで生成中なら、number 番目ができるか失敗が決まるまで待つ"""
+        with self._changed:
+            while True:
+                progress = self._games.get(game_id)
+                if progress is None or progress.ready > number:
+                    return
+                if progress.ready + progress.pending <= number:
+                    return
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return
+                self._changed.wait(remaining)
+
+    def _wait_remote(self, game_id, number, deadline):
+        """別のワーカーで生成中なら、ストアの進み具合を見ながら待つ"""
+        while True:
+            status = self.store.get(self._status_key(game_id))
+            if status is None or status["ready"] > number:
+                return
+            if status["rounds"] - status["failed"] <= number:
+                return
+            if time.time() + self.poll_interval > deadline:
+                return
+            time.sleep(self.poll_interval)
+
+    def take(self, game_id, number, timeout=30):
+        """number 番目（0始まり）のクイズ。生成中なら timeout 秒まで待つ
+
+        生成に失敗した・間に合わなかった場合はNone（呼び出し元で従来どおり生成する）。
+        """
+        started = time.time()
+        deadline = started + timeout
+        with metrics.span("prefetch_wait"):
+            with self._changed:
+                local = game_id in self._games
+            if local:
+                self._wait_local(game_id, number, deadline)
+            else:
+                self._wait_remote(game_id, number, deadline)
+            quiz = self.store.get(self._quiz_key(game_id, number))
+
+        waited = time.time() - started
+        with self._changed:
+            if quiz:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if waited >= 0.01:
+                self.waited += 1
+                self.wait_seconds += waited
+        return quiz
+
+    def get_stats(self):
+        with self._changed:
+            return {
+                "games": self.games,
+                "in_progress": len(self._games),
+                "generated": self.generated,
+                "failures": self.failures,
+                "hits": self.hits,
+                "misses": self.misses,
+                "waited": self.waited,
+                "wait_avg": round(self.wait_seconds / self.waited, 3) if self.waited else 0,
+            }
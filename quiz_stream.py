@@ -0,0 +1,88 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class QuizJob:
+    """記事を表示している間にバックグラウンドで進むクイズ生成"""
+
+    def __init__(self, article):
+        self.id = uuid.uuid4().hex
+        self.article = article
+        self.question = None  # ブラウザに送る問題文と選択肢
+        self.quiz = None  # 正解・解説を含む完全なクイズ
+        self.done = False
+        self.retry_after = None  # 回数制限などで断られた場合、再試行できるまでの秒数
+        self.created_at = time.time()
+        self._changed = threading.Condition()
+
+    def set_question(self, question):
+        with self._changed:
+            self.question = question
+            self._changed.notify_all()
+
+    def finish(self, quiz):
+        with self._changed:
+            self.quiz = quiz
+            self.done = True
+            self._changed.notify_all()
+
+    def wait(self, predicate, timeout):
+        """predicate(job) が真になるか timeout 秒経つまで待つ"""
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self), timeout=timeout)
+
+
+class QuizStreamer:
+    """記事表示とクイズ生成を並行させるためのジョブ管理"""
+
+    def __init__(self, quiz_generator, max_jobs=200, ttl=600):
+        self.quiz_generator = quiz_generator
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, article):
+        """生成を開始してジョブを返す"""
+        job = QuizJob(article)
+        with self._lock:
+            now = time.time()
+            while self._jobs and (
+                len(self._jobs) >= self.max_jobs
+                or now - next(iter(self._jobs.values())).created_at > self.ttl
+            ):
+                self._jobs.popitem(last=False)
+            self._jobs[job.id] = job
+
+        # 計測のラベル（route等）を生成スレッドに引き継ぐ
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(self._run, job), daemon=True)
+        thread.start()
+        return job
+
+    def _run(self, job):
+        quiz = None
+        try:
+            quiz = self.quiz_generator.generate_quiz_streaming(
+                job.article["content"], job.set_question
+            )
+        except Exception as e:
+            job.retry_after = getattr(e, "retry_after", None)
+            logger.error("生成エラー - %s", e)
+        finally:
+            job.finish(quiz)
+
+    def get(self, job_id):
+        """このプロセスで実行中・実行済みのジョブ。なければNone"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id):
+        with self._lock:
+            return self._jobs.pop(job_id, None)
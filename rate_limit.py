@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """待ち時間が上限を超えるため、外部サービスを呼ばずに断った"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name}の呼び出し回数の上限に達しました（{retry_after:.0f}秒後に再試行）")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """1分あたり per_minute 回（続けてなら burst 回）まで呼び出せるトークンバケット
+
+    トークンがなければ max_wait 秒まで順番待ちし、それより長く待つ必要があれば
+    呼び出す前に RateLimited を送出する（生成の途中でクォータ超過になるより早く断る）。
+    待ちは予約制で、先に来た呼び出しから順にトークンを割り当てる。
+
+    background=True の呼び出し（クローラーなど）は予約せず、トークンが
+    reserve 個より多く残っているときだけ取る。先の時間のトークンを押さえないので、
+    利用者のリクエストの待ち時間を延ばさない。
+    """
+
+    def __init__(self, name, per_minute, burst=None, max_wait=5.0, reserve=None):
+        self.name = name
+        self.per_minute = per_minute
+        self.rate = per_minute / 60
+        self.burst = burst or max(1, round(per_minute / 6))
+        self.max_wait = max_wait
+        # 後回しの呼び出しが手を付けない（利用者のリクエストに残す）トークン数
+        self.reserve = min(self.burst // 2 if reserve is None else reserve, self.burst - 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+        self.background = 0
+
+    def _refill(self):
+        """ロック取得中に呼び出すこと"""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait=None, background=False):
+        """トークンを1つ取る（必要なら待つ）。待った秒数を返す"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        if background:
+            return self._acquire_background(max_wait)
+        with self._lock:
+            self._refill()
+            # 足りなければマイナスにして予約する（待っている呼び出しの数だけ負になる）
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            if wait > max_wait:
+                self._tokens += 1
+                self.rejected += 1
+                raise RateLimited(self.name, wait)
+            self.acquired += 1
+            if wait:
+                self.waited += 1
+                self.wait_seconds += wait
+        if wait:
+            logger.debug("%sの呼び出しを%.2f秒待ちます", self.name, wait)
+            time.sleep(wait)
+        return wait
+
+    def _acquire_background(self, max_wait):
+        """予約せず、reserve 個を残せるだけトークンがたまるまで待ってから取る"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                waited = time.monotonic() - started
+                if self._tokens >= self.reserve + 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    self.background += 1
+                    if waited:
+                        self.waited += 1
+                        self.wait_seconds += waited
+                    return waited
+                # 利用者の予約で負になっていれば、その分も待つ
+                wait = (self.reserve + 1 - self._tokens) / self.rate
+                if waited + wait > max_wait:
+                    self.rejected += 1
+                    raise RateLimited(self.name, wait)
+            time.sleep(wait)
+
+    def get_stats(self):
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            return {
+                "per_minute": self.per_minute,
+                "burst": self.burst,
+                "max_wait": self.max_wait,
+                "reserve": self.reserve,
+                "tokens": round(tokens, 2),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_avg": round(self.wait_seconds / self.waited, 3) if self.waited else 0,
+                "rejected": self.rejected,
+                "background": self.background,
+            }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """同じキーの呼び出しが実行中なら、新たに呼ばずにその結果（例外）を共有する"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """fn() の結果を返す。戻り値は同時に待っていた呼び出し元と同じオブジェクト"""
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+                "shared_rate": round(self.shared / self.calls * 100, 1) if self.calls else 0,
+            }
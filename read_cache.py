@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReadCache:
+    """短いTTLの読み取りキャッシュ（期限切れ直後は古い値を返しつつ裏で更新）
+
+    - 作成から ttl 秒以内: キャッシュをそのまま返す
+    - ttl〜ttl+stale_ttl 秒: 古い値を返し、バックグラウンドで1回だけ読み直す
+    - それ以降・未取得: その場で読み込む
+    """
+
+    def __init__(self, ttl=30, stale_ttl=300):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}  # key -> (作成時刻, 値)
+        self._refreshing = set()
+        self._generation = 0  # invalidateのたびに増える
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        """キャッシュから取得。必要なら loader() で読み込む"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(
+                            target=self._refresh, args=(key, loader), daemon=True
+                        ).start()
+                    return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        self._set(key, value, generation)
+        return value
+
+    def _set(self, key, value, generation):
+        with self._lock:
+            # 読み込み中にinvalidateされた場合は古い可能性があるので保存しない
+            if generation == self._generation:
+                self._entries[key] = (time.time(), value)
+
+    def _refresh(self, key, loader):
+        with self._lock:
+            generation = self._generation
+        try:
+            self._set(key, loader(), generation)
+        except Exception as e:
+            logger.error("更新エラー (%s) - %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self):
+        """すべて破棄（このプロセスで書き込みをしたときに呼ぶ）"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
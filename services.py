@@ -0,0 +1,392 @@
+"""アプリが使うサービス（Gemini・Firebase・キャッシュ等）の遅延初期化
+
+各サービスは最初に使われたときに作られる。起動時に重いライブラリの
+import やgRPCチャンネルの作成を行わないため、ワーカーの起動が速く、
+gunicornの preload_app でfork前にチャンネルが作られることもない。
+"""
+import logging
+import os
+import threading
+
+from http_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# 負荷試験モード（Gemini・Firestoreをloadtest/のスタンドインに置き換える）
+LOADTEST = os.environ.get("LOADTEST") == "1"
+
+_instances = {}
+_lock = threading.RLock()
+
+
+def _get(name, factory):
+    """name のインスタンスを返す（初回のみ factory() で作る）"""
+    if name in _instances:
+        return _instances[name]
+    with _lock:
+        if name not in _instances:
+            _instances[name] = factory()
+        return _instances[name]
+
+
+# --------------------------
+# 外部サービスの回数制限
+# --------------------------
+def _per_worker(per_minute):
+    """全体の上限をワーカー数（WEB_CONCURRENCY）で分けた、このプロセスの上限"""
+    return per_minute / max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+
+def get_gemini_limiter():
+    """Gemini呼び出しの回数制限（TokenBucket）。GEMINI_RATE_LIMIT が0ならNone
+
+    GEMINI_RATE_LIMIT は全ワーカー合計の1分あたりの回数、
+    GEMINI_RATE_LIMIT_WAIT は順番待ちできる秒数（超えるなら503で断る）。
+    """
+
+    def factory():
+        per_minute = float(os.environ.get("GEMINI_RATE_LIMIT", 60))
+        if per_minute <= 0:
+            return None
+        from rate_limit import TokenBucket
+
+        return TokenBucket(
+            "Gemini",
+            _per_worker(per_minute),
+            max_wait=float(os.environ.get("GEMINI_RATE_LIMIT_WAIT", 5)),
+        )
+
+    return _get("gemini_limiter", factory)
+
+
+def get_yahoo_limiter():
+    """Yahoo!ニュースへのリクエストの回数制限。共有のHTTPキャッシュに設定する
+
+    YAHOO_RATE_LIMIT（1分あたり、0なら制限しない）と YAHOO_RATE_LIMIT_WAIT（秒）。
+    クローラーの取得は YAHOO_RATE_LIMIT_RESERVE 個（既定はバーストの半分）の
+    トークンを利用者のリクエストのために残す。
+    """
+
+    def factory():
+        per_minute = float(os.environ.get("YAHOO_RATE_LIMIT", 120))
+        if per_minute <= 0:
+            return None
+        from rate_limit import TokenBucket
+
+        limiter = TokenBucket(
+            "Yahoo!ニュース",
+            _per_worker(per_minute),
+            max_wait=float(os.environ.get("YAHOO_RATE_LIMIT_WAIT", 2)),
+            reserve=(
+                int(os.environ["YAHOO_RATE_LIMIT_RESERVE"])
+                if os.environ.get("YAHOO_RATE_LIMIT_RESERVE")
+                else None
+            ),
+        )
+        shared_cache.limiter = limiter
+        return limiter
+
+    return _get("yahoo_limiter", factory)
+
+
+# --------------------------
+# 記事収集
+# --------------------------
+def get_article_index():
+    """収集・出題した記事の索引（ARTICLE_DEDUP_HOURS=0 で重複チェックを無効にする）"""
+    window = float(os.environ.get("ARTICLE_DEDUP_HOURS", 24)) * 3600
+    if window <= 0:
+        return None
+
+    def factory():
+        from article_index import ArticleIndex, DEFAULT_DISTANCE
+
+        try:
+            return ArticleIndex(
+                path=os.environ.get("ARTICLE_INDEX_PATH", "article_index.sqlite3"),
+                window=window,
+                max_age=int(os.environ.get("ARTICLE_INDEX_TTL", 7 * 24 * 3600)),
+                max_distance=int(os.environ.get("ARTICLE_DEDUP_DISTANCE", DEFAULT_DISTANCE)),
+            )
+        except Exception as e:
+            logger.warning("記事索引初期化失敗: %s", e)
+            return None
+
+    return _get("article_index", factory)
+
+
+def get_article_sources():
+    """カテゴリごとの記事クローラーとストア（収集した記事をクイズ生成に使う）
+
+    ARTICLE_CATEGORIES は "business:3,it:1:600" のように カテゴリ:重み[:間隔（秒）]。
+    """
+    if os.environ.get("ARTICLE_CRAWLER_ENABLED", "1") != "1":
+        return None
+
+    def factory():
+        from article_crawler import TOPICS_URL
+        from article_sources import DEFAULT_CATEGORIES, ArticleSources, parse_categories
+
+        get_yahoo_limiter()
+        categories = parse_categories(
+            os.environ.get("ARTICLE_CATEGORIES", DEFAULT_CATEGORIES),
+            default_interval=int(os.environ.get("ARTICLE_CRAWLER_INTERVAL", 300)),
+        )
+        return ArticleSources(
+            categories,
+            topics_url=os.environ.get("YAHOO_TOPICS_URL", TOPICS_URL),
+            index=get_article_index(),
+            per_host_limit=int(os.environ.get("ARTICLE_CRAWLER_PER_HOST", 4)),
+            delay=float(os.environ.get("ARTICLE_CRAWLER_DELAY", 0.5)),
+            time_budget=float(os.environ.get("ARTICLE_CRAWLER_BUDGET", 30)),
+        )
+
+    return _get("article_sources", factory)
+
+
+def start_crawler():
+    sources = get_article_sources()
+    if sources is not None:
+        sources.start()
+
+
+# --------------------------
+# クイズ生成
+# --------------------------
+def get_quiz_cache():
+    """クイズ生成キャッシュ（ワーカー間・再起動後も共有）"""
+
+    def factory():
+        from quiz_cache import QuizCache
+
+        try:
+            return QuizCache(
+                path=os.environ.get("QUIZ_CACHE_PATH", "quiz_cache.sqlite3"),
+                ttl=int(os.environ.get("QUIZ_CACHE_TTL", 7 * 24 * 3600)),
+                max_bytes=int(os.environ.get("QUIZ_CACHE_MAX_BYTES", 50 * 1024 * 1024)),
+            )
+        except Exception as e:
+            logger.warning("クイズキャッシュ初期化失敗: %s", e)
+            return None
+
+    return _get("quiz_cache", factory)
+
+
+def get_quiz_generator():
+    """QuizGenerator。GEMINI_API_KEYがない・初期化に失敗した場合はNone"""
+
+    def factory():
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.error("GEMINI_API_KEYが設定されていません。HerokuのConfig Varsを確認してください。")
+            return None
+        try:
+            from honban import QuizGenerator, TOPICS_URL
+            from prompt_builder import DEFAULT_TOKEN_BUDGET
+
+            get_yahoo_limiter()
+
+            models = None
+            if LOADTEST:
+                from loadtest.fake_gemini import create_models
+
+                models = create_models()
+
+            hedger = None
+            if os.environ.get("QUIZ_HEDGING", "0") == "1":
+                from hedging import Hedger
+
+                hedger = Hedger(
+                    percentile=float(os.environ.get("QUIZ_HEDGE_PERCENTILE", 90)),
+                    budget=float(os.environ.get("QUIZ_HEDGE_BUDGET", 0.05)),
+                )
+
+            quiz_generator = QuizGenerator(
+                api_key=api_key,
+                article_sources=get_article_sources(),
+                article_index=get_article_index(),
+                quiz_cache=get_quiz_cache(),
+                output_mode=os.environ.get("QUIZ_OUTPUT_MODE", "json"),
+                model_names=[
+                    name.strip()
+                    for name in os.environ.get("GEMINI_MODELS", "").split(",")
+                    if name.strip()
+                ]
+                or None,
+                hedger=hedger,
+                models=models,
+                topics_url=os.environ.get("YAHOO_TOPICS_URL", TOPICS_URL),
+                rate_limiter=get_gemini_limiter(),
+                # 記事本文に使うトークン数の上限（0なら本文をそのまま送る）
+                prompt_token_budget=int(
+                    os.environ.get("QUIZ_PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)
+                ),
+            )
+            logger.info("QuizGeneratorの初期化に成功しました")
+            return quiz_generator
+        except Exception as e:
+            logger.error("QuizGenerator初期化エラー: %s", e)
+            return None
+
+    return _get("quiz_generator", factory)
+
+
+def get_quiz_pool():
+    """クイズ事前生成プール（補充ワーカーは最初の取得時に起動）"""
+    if os.environ.get("QUIZ_POOL_ENABLED", "1") != "1":
+        return None
+    quiz_generator = get_quiz_generator()
+    if quiz_generator is None:
+        return None
+
+    def factory():
+        from quiz_pool import QuizPool
+
+        # QUIZ_BATCH_SIZEが2以上なら、複数記事を1回のAPI呼び出しでまとめて生成
+        batch_size = int(os.environ.get("QUIZ_BATCH_SIZE", 1))
+        return QuizPool(
+            (
+                (lambda: quiz_generator.create_quizzes(batch_size))
+                if batch_size > 1
+                else quiz_generator.create_quiz
+            ),
+            low_water=int(os.environ.get("QUIZ_POOL_LOW_WATER", 2)),
+            min_target=int(os.environ.get("QUIZ_POOL_MIN_TARGET", 3)),
+            max_target=int(os.environ.get("QUIZ_POOL_MAX_TARGET", 20)),
+            max_age=int(os.environ.get("QUIZ_POOL_MAX_AGE", 600)),
+            workers=int(os.environ.get("QUIZ_POOL_WORKERS", 2)),
+        )
+
+    return _get("quiz_pool", factory)
+
+
+def get_quiz_prefetcher():
+    """ゲーム開始時に全ラウンドのクイズを並行生成する（QUIZ_PREFETCH_ENABLED=0 で無効）"""
+    if os.environ.get("QUIZ_PREFETCH_ENABLED", "1") != "1":
+        return None
+    quiz_generator = get_quiz_generator()
+    if quiz_generator is None:
+        return None
+
+    def factory():
+        from quiz_prefetch import QuizPrefetcher
+
+        quiz_pool = get_quiz_pool()
+
+        def produce(category):
+            # 事前生成プールにあればそれを使い、なければ生成する
+            quiz_data = None
+            if quiz_pool is not None:
+                quiz_data = quiz_pool.get(fallback=False, category=category)
+            return quiz_data or quiz_generator.create_quiz(category)
+
+        return QuizPrefetcher(
+            produce,
+            get_game_store(),
+            workers=int(os.environ.get("QUIZ_PREFETCH_WORKERS", 8)),
+        )
+
+    return _get("quiz_prefetcher", factory)
+
+
+def get_quiz_streamer():
+    """ストリーミング配信（記事を先に表示し、問題はSSEで後から送る）"""
+    if os.environ.get("QUIZ_DELIVERY", "stream") != "stream":
+        return None
+    quiz_generator = get_quiz_generator()
+    if quiz_generator is None:
+        return None
+
+    def factory():
+        from quiz_stream import QuizStreamer
+
+        return QuizStreamer(quiz_generator)
+
+    return _get("quiz_streamer", factory)
+
+
+# --------------------------
+# Firebase・ゲーム状態
+# --------------------------
+def get_firebase_service():
+    """FirebaseService。初期化に失敗した場合はNone"""
+
+    def factory():
+        try:
+            from firebase_service import FirebaseService
+
+            db = None
+            if LOADTEST:
+                from loadtest.fake_firestore import FakeFirestore
+
+                db = FakeFirestore()
+            firebase_service = FirebaseService(db=db)
+            logger.info("Firebase: サービス初期化成功")
+            return firebase_service
+        except Exception as e:
+            logger.warning("Firebase初期化失敗: %s", e)
+            return None
+
+    return _get("firebase_service", factory)
+
+
+def get_game_store():
+    """ゲーム状態ストア（クッキーにはゲームIDだけを入れる）"""
+
+    def factory():
+        from game_store import create_game_store
+
+        kind = os.environ.get("GAME_STORE", "sqlite")
+        firebase_service = get_firebase_service() if kind == "firestore" else None
+        return create_game_store(
+            kind=kind,
+            ttl=int(os.environ.get("GAME_STATE_TTL", 3600)),
+            path=os.environ.get("GAME_STORE_PATH", "game_state.sqlite3"),
+            db=firebase_service.db if firebase_service is not None else None,
+        )
+
+    return _get("game_store", factory)
+
+
+def get_stats_executor():
+    """統計ページの読み取りを並行実行するためのスレッド"""
+
+    def factory():
+        from concurrent.futures import ThreadPoolExecutor
+
+        return ThreadPoolExecutor(max_workers=4, thread_name_prefix="stats")
+
+    return _get("stats_executor", factory)
+
+
+# --------------------------
+# プロセス管理
+# --------------------------
+def preload_modules():
+    """重いライブラリをimportだけしておく（preload_app時にマスターで呼ぶ）
+
+    クライアントやgRPCチャンネルは作らないため、fork後も安全に使える。
+    """
+    import google.generativeai  # noqa: F401
+    import firebase_admin  # noqa: F401
+    from firebase_admin import firestore  # noqa: F401
+
+
+def close():
+    """終了処理（未書き込みの結果を書き出す）"""
+    firebase_service = _instances.get("firebase_service")
+    if firebase_service is not None:
+        firebase_service.close()
+
+
+def reset_after_fork():
+    """fork後のワーカーで呼び、親プロセスで作られたクライアントを捨てる
+
+    スレッドやgRPCチャンネル、HTTPコネクションはforkをまたいで使えないため、
+    次に使われたときに作り直す。
+    """
+    global _lock
+    _lock = threading.RLock()
+    _instances.clear()
+    shared_cache.reset()
+    shared_cache.limiter = None
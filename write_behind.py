@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from google.api_core import exceptions as google_exceptions
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Firestoreの1バッチあたりの書き込み上限
+MAX_BATCH_WRITES = 500
+# サーバーで適用されていないことが確実なエラー（送り直しても二重に反映されない）
+NOT_APPLIED_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.TooManyRequests,  # RESOURCE_EXHAUSTED
+    google_exceptions.ServiceUnavailable,
+)
+
+
+def _has_increment(data):
+    """Increment（送り直すと二重に加算される）を含むか"""
+    return any(
+        _has_increment(value) if isinstance(value, dict) else type(value).__name__ == "Increment"
+        for value in data.values()
+    )
+
+
+def _unit_has_increment(unit):
+    return any(_has_increment(data) for _, data, _ in unit)
+
+
+class WriteBehindQueue:
+    """Firestoreへの書き込みをためておき、WriteBatchでまとめてコミットする
+
+    リクエスト処理中はキューに積むだけなので、Firestoreの往復を待たない。
+    1回の enqueue に渡した書き込みは同じバッチでコミットされる。
+    Increment を含む単位は、適用されたか分からない失敗（タイムアウト等）では
+    送り直さずに破棄する（集計が二重に加算されるよりは1件抜けるほうがよい）。
+    """
+
+    def __init__(
+        self,
+        db,
+        max_queue=1000,
+        batch_size=100,
+        flush_interval=1.0,
+        max_retries=5,
+        on_commit=None,
+    ):
+        self.db = db
+        # コミット成功後に書き込みのリストを渡して呼ばれる（読み取りキャッシュの破棄などに使う）
+        self.on_commit = on_commit
+        self.max_queue = max_queue
+        self.batch_size = min(batch_size, MAX_BATCH_WRITES)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+
+        self._queue = deque()  # 書き込みのリスト [(doc_ref, data, merge), ...]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flushing = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+        # 統計情報
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_commits = 0
+        self.ambiguous_failures = 0
+        self.last_flush_latency = 0
+
+    def _ensure_started(self):
+        """ロック取得中に呼び出すこと"""
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(
+                target=self._run, name="firestore-write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def enqueue(self, writes):
+        """書き込みをキューに積む。キューがいっぱいならFalse（破棄）"""
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += len(writes)
+                logger.error("キューが満杯のため%d件を破棄しました", len(writes))
+                return False
+            self._queue.append(writes)
+            self.enqueued += len(writes)
+            self._ensure_started()
+            if len(self._queue) >= self.batch_size:
+                self._wakeup.notify()
+            return True
+
+    def _take_batch(self):
+        """ロック取得中に呼び出すこと。batch_size件までの書き込みを取り出す"""
+        units = []
+        count = 0
+        while self._queue and (not units or count + len(self._queue[0]) <= self.batch_size):
+            unit = self._queue.popleft()
+            units.append(unit)
+            count += len(unit)
+        return units
+
+    def _commit(self, units):
+        """リトライ付きでコミット。最終的に失敗したら破棄してFalse
+
+        適用されたか分からない失敗のあとは、Increment を含む単位だけを破棄し、
+        残りの単位（送り直しても同じ結果になる set）は送り直す。
+        """
+        committed = True
+        for attempt in range(self.max_retries):
+            writes = [write for unit in units for write in unit]
+            try:
+                batch = self.db.batch()
+                for doc_ref, data, merge in writes:
+                    batch.set(doc_ref, data, merge=merge)
+                started = time.time()
+                with metrics.span("firestore.commit"):
+                    batch.commit()
+                self.last_flush_latency = time.time() - started
+                self.written += len(writes)
+                if self.on_commit is not None:
+                    self.on_commit(writes)
+                return committed
+            except Exception as e:
+                self.failed_commits += 1
+                if not isinstance(e, NOT_APPLIED_ERRORS):
+                    unsafe = [unit for unit in units if _unit_has_increment(unit)]
+                    if unsafe:
+                        count = sum(len(unit) for unit in unsafe)
+                        self.ambiguous_failures += 1
+                        self.dropped += count
+                        committed = False
+                        logger.error(
+                            "適用されたか不明なため、加算を含む%d件は再送しません - %s", count, e
+                        )
+                        units = [unit for unit in units if not _unit_has_increment(unit)]
+                        if not units:
+                            return False
+                logger.warning("コミット失敗 (%d/%d) - %s", attempt + 1, self.max_retries, e)
+                if attempt + 1 < self.max_retries:
+                    time.sleep(min(30, 0.5 * 2**attempt))
+
+        count = sum(len(unit) for unit in units)
+        self.dropped += count
+        logger.error("%d件の書き込みを破棄しました", count)
+        return False
+
+    def flush(self):
+        """キューが空になるまでコミット"""
+        with self._flushing:
+            while True:
+                with self._lock:
+                    units = self._take_batch()
+                if not units:
+                    return
+                self._commit(units)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopped and len(self._queue) < self.batch_size:
+                    self._wakeup.wait(timeout=self.flush_interval)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def close(self, timeout=10):
+        """残りを書き出してスレッドを止める（ワーカー終了時に呼ぶ）"""
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+        else:
+            self.flush()
+
+    def get_stats(self):
+        """キューの状態を取得"""
+        with self._lock:
+            return {
+                "queue_depth": sum(len(unit) for unit in self._queue),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed_commits": self.failed_commits,
+                "ambiguous_failures": self.ambiguous_failures,
+                "last_flush_latency": round(self.last_flush_latency, 3),
+            }